@@ -0,0 +1,193 @@
+"""
+Aho-Corasick multi-pattern matcher working on sequences of tokens.
+
+Based on
+
+Efficient string matching: an aid to bibliographic search
+A. V. Aho and M. J. Corasick
+Communications of the ACM, 18(6), 1975, pp 333-340.
+
+The automaton is built once from all the patterns and then each text is
+scanned left to right only once, so the cost of a search depends on the length
+of the text and on the number of matches, not on the number of patterns.
+Patterns and texts are sequences of strings (tokens) instead of sequences of
+characters.
+"""
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher for sequences of tokens
+
+    Patterns are added with the add method. Each pattern can carry a value that
+    is returned with each of its matches. When all the patterns are added, the
+    build method must be called before any search.
+    """
+
+    def __init__(self):
+        # node 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._depth = [0]
+        self._value = [None]
+        self._terminal = [False]
+        self._out = None
+        self._num_patterns = 0
+
+    def __len__(self):
+        return self._num_patterns
+
+    def add(self, pattern, value=None):
+        """
+        Adds a pattern to the automaton
+
+        If the same pattern is added more than once, only the first value is
+        kept.
+
+        :param pattern: the pattern to add
+        :type pattern: Sequence[str]
+        :param value: value associated to the pattern
+        :type value: Any
+        :raise ValueError: if the pattern is empty
+        """
+        if len(pattern) == 0:
+            raise ValueError('empty pattern')
+
+        node = 0
+        for tok in pattern:
+            nxt = self._goto[node].get(tok)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][tok] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[node] + 1)
+                self._value.append(None)
+                self._terminal.append(False)
+            node = nxt
+
+        if not self._terminal[node]:
+            self._terminal[node] = True
+            self._value[node] = value
+            self._num_patterns += 1
+
+        # the automaton must be built again
+        self._out = None
+
+    def build(self):
+        """
+        Computes the failure links and the output of each node
+
+        Must be called after the last pattern is added and before any search.
+        """
+        out = [()] * len(self._goto)
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            # the failure node is shallower so its output is already complete
+            fail_out = out[self._fail[node]]
+            out[node] = (node,) + fail_out if self._terminal[node] else fail_out
+            for tok, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and tok not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(tok, 0)
+                queue.append(child)
+
+        self._out = out
+
+    def matches(self, tokens):
+        """
+        Generator that yields all the matches found in tokens
+
+        The matches are yielded in order of end position. Matches with the same
+        end position are yielded from the longest to the shortest.
+        Each match is a tuple (start, length, value) with
+        tokens[start:start + length] equal to the pattern and value the value
+        associated to the pattern.
+
+        :param tokens: the text to search
+        :type tokens: Sequence[str]
+        :return: a generator that yields the matches
+        :rtype: Generator[tuple[int, int, Any], Any, None]
+        :raise RuntimeError: if the automaton is not built
+        """
+        if self._out is None:
+            raise RuntimeError('build must be called before any search')
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        depth = self._depth
+        value = self._value
+        node = 0
+        for i, tok in enumerate(tokens):
+            while node and tok not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(tok, 0)
+            for p in out[node]:
+                length = depth[p]
+                yield i - length + 1, length, value[p]
+
+    def longest_matches(self, tokens):
+        """
+        Returns the leftmost-longest non overlapping matches found in tokens
+
+        The text is scanned from left to right. At each position the longest
+        pattern that starts there is selected, and the scan restarts after the
+        end of the selected match.
+
+        :param tokens: the text to search
+        :type tokens: Sequence[str]
+        :return: the selected matches as tuples (start, length, value) ordered
+            by start position
+        :rtype: list[tuple[int, int, Any]]
+        """
+        best = {}
+        for start, length, value in self.matches(tokens):
+            b = best.get(start)
+            if b is None or length > b[0]:
+                best[start] = (length, value)
+
+        selected = []
+        next_free = 0
+        for start in sorted(best):
+            if start >= next_free:
+                length, value = best[start]
+                selected.append((start, length, value))
+                next_free = start + length
+
+        return selected
+
+    def replace(self, tokens, replacement):
+        """
+        Replaces the leftmost-longest matches found in tokens
+
+        Each match is replaced by a single token, computed by calling
+        replacement(matched_tokens, value), where matched_tokens is the list of
+        the matched tokens and value is the value associated to the pattern.
+
+        :param tokens: the text to transform
+        :type tokens: Sequence[str]
+        :param replacement: callable that gives the replacement for a match
+        :type replacement: Callable[[list[str], Any], str]
+        :return: the transformed text
+        :rtype: list[str]
+        """
+        if self._num_patterns == 0:
+            return list(tokens)
+
+        text = []
+        prev = 0
+        for start, length, value in self.longest_matches(tokens):
+            text.extend(tokens[prev:start])
+            text.append(replacement(tokens[start:start + length], value))
+            prev = start + length
+
+        text.extend(tokens[prev:])
+        return text
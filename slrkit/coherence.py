@@ -0,0 +1,223 @@
+"""
+C_v coherence of the topics of a model, computed from precomputed statistics.
+
+The co-occurrence counts of the words in the sliding windows of a corpus are
+computed only once and saved in a sparse matrix, so the coherence of the
+topics of any model trained on the corpus is computed with few lookups.
+The results are the same of the gensim CoherenceModel with coherence='c_v':
+the windows are counted in the same way of the gensim
+WordOccurrenceAccumulator, including the way a word that leaves a window is
+removed from it even if the word appears again inside the window.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+from gensim import matutils
+from scipy import sparse
+
+# default values used by the gensim CoherenceModel for the c_v coherence
+C_V_WINDOW_SIZE = 110
+C_V_TOPN = 20
+# same epsilon of gensim.topic_coherence.direct_confirmation_measure
+EPSILON = 1e-12
+
+
+def num_windows(texts, window_size=C_V_WINDOW_SIZE):
+    """
+    Counts the sliding windows of a corpus
+
+    A document shorter than the window is a single window.
+
+    :param texts: the tokenized documents
+    :type texts: list[list[str]]
+    :param window_size: size of the sliding windows
+    :type window_size: int
+    :return: the number of windows
+    :rtype: int
+    """
+    return sum(max(len(t) - window_size + 1, 1) for t in texts)
+
+
+def model_topics(model, topn=C_V_TOPN):
+    """
+    Gives the top words of each topic of a model
+
+    The words are selected as the gensim CoherenceModel does.
+
+    :param model: the trained lda model
+    :type model: gensim.models.LdaModel
+    :param topn: number of words of each topic
+    :type topn: int
+    :return: the top words of each topic, from the most probable
+    :rtype: list[list[str]]
+    """
+    return [[model.id2word[i] for i in matutils.argsort(t, topn=topn,
+                                                        reverse=True)]
+            for t in model.get_topics()]
+
+
+class CoherenceIndex:
+    """
+    Sliding window statistics of the words of a corpus
+
+    The occurrences attribute has the number of windows containing each word,
+    and the cooccurrences attribute is the sparse matrix with the number of
+    windows containing each pair of words. Its diagonal is equal to
+    occurrences.
+    The index can be used to compute the coherence on a subset of the
+    documents it was built from, if the removed documents do not contain any
+    of the words of the topics.
+    """
+
+    def __init__(self, texts, words=None, window_size=C_V_WINDOW_SIZE):
+        """
+        :param texts: the tokenized documents
+        :type texts: list[list[str]]
+        :param words: the words to index. If None, all the words of texts are
+            indexed
+        :type words: Iterable[str] or None
+        :param window_size: size of the sliding windows
+        :type window_size: int
+        """
+        self.window_size = window_size
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64,
+                              count=len(texts))
+        tokens = list(itertools.chain.from_iterable(texts))
+        if words is None:
+            codes, vocabulary = pd.factorize(pd.Series(tokens, dtype=object))
+            vocabulary = pd.Index(vocabulary)
+        else:
+            vocabulary = pd.Index(list(dict.fromkeys(words)), dtype=object)
+            codes = vocabulary.get_indexer(tokens)
+
+        self.token2id = {w: i for i, w in enumerate(vocabulary)}
+        starts = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        doc = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        pos = np.arange(len(tokens), dtype=np.int64) - starts[doc]
+        keep = codes >= 0
+        self._build(doc[keep], codes[keep].astype(np.int64), pos[keep],
+                    np.maximum(lengths - window_size + 1, 1))
+
+    def _build(self, doc, word, pos, doc_windows):
+        """
+        Computes the occurrences and co-occurrences of the words
+
+        Each window is a step. When the window slides, the word that leaves
+        the window is removed and then the entering word is added, so the
+        steps where a word is present are the ones between one of its
+        additions and the first removal that follows. The steps of a document
+        are split in segments where the set of words present is constant, and
+        the co-occurrences are computed from the segments-words matrix.
+
+        :param doc: document of each token
+        :type doc: np.ndarray
+        :param word: id of each token
+        :type word: np.ndarray
+        :param pos: position of each token in its document
+        :type pos: np.ndarray
+        :param doc_windows: number of windows of each document
+        :type doc_windows: np.ndarray
+        """
+        vocab_size = len(self.token2id)
+        add_step = np.maximum(pos - self.window_size + 1, 0)
+        rem = pos + 1 < doc_windows[doc]
+        ev_doc = np.concatenate([doc, doc[rem]])
+        ev_word = np.concatenate([word, word[rem]])
+        ev_step = np.concatenate([add_step, pos[rem] + 1])
+        # at the same step the removal happens before the addition
+        ev_add = np.concatenate([np.ones(len(doc), dtype=bool),
+                                 np.zeros(rem.sum(), dtype=bool)])
+        order = np.lexsort((ev_add, ev_step, ev_word, ev_doc))
+        ev_doc = ev_doc[order]
+        ev_word = ev_word[order]
+        ev_step = ev_step[order]
+        ev_add = ev_add[order]
+
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = ((ev_doc[1:] != ev_doc[:-1])
+                           | (ev_word[1:] != ev_word[:-1]))
+        present_before = np.zeros(len(order), dtype=bool)
+        present_before[1:] = ev_add[:-1]
+        present_before[group_start] = False
+        flip = np.flatnonzero(ev_add != present_before)
+        # the flips of a word alternate: each start is followed by its end
+        # or it lasts until the last window of the document
+        starts = flip[ev_add[flip]]
+        ends = doc_windows[ev_doc[starts]]
+        nxt = np.searchsorted(flip, starts) + 1
+        has_end = nxt < len(flip)
+        nxt_event = flip[np.minimum(nxt, len(flip) - 1)]
+        has_end &= ((ev_doc[nxt_event] == ev_doc[starts])
+                    & (ev_word[nxt_event] == ev_word[starts]))
+        ends[has_end] = ev_step[nxt_event[has_end]]
+        int_doc = ev_doc[starts]
+        int_word = ev_word[starts]
+        int_start = ev_step[starts]
+
+        stride = int(doc_windows.max(initial=1)) + 1
+        bounds = np.unique(np.concatenate([int_doc * stride + int_start,
+                                           int_doc * stride + ends]))
+        weights = np.zeros(len(bounds), dtype=np.int64)
+        if len(bounds) > 1:
+            same_doc = bounds[1:] // stride == bounds[:-1] // stride
+            weights[:-1] = np.where(same_doc, bounds[1:] - bounds[:-1], 0)
+
+        first = np.searchsorted(bounds, int_doc * stride + int_start)
+        last = np.searchsorted(bounds, int_doc * stride + ends)
+        count = last - first
+        offsets = np.repeat(np.cumsum(count) - count, count)
+        rows = (np.arange(count.sum(), dtype=np.int64) - offsets
+                + np.repeat(first, count))
+        cols = np.repeat(int_word, count)
+        x = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64),
+                               (rows, cols)),
+                              shape=(len(bounds), vocab_size))
+        self.cooccurrences = (x.T @ sparse.diags(weights) @ x).tocsr()
+        self.occurrences = self.cooccurrences.diagonal()
+
+    def c_v_per_topic(self, topics, windows):
+        """
+        Computes the c_v coherence of some topics
+
+        :param topics: the top words of each topic. All the words must be in
+            the index
+        :type topics: list[list[str]]
+        :param windows: number of windows of the documents used, as returned
+            by num_windows
+        :type windows: int
+        :return: the coherence of each topic
+        :rtype: list[float]
+        """
+        n = float(windows)
+        coherences = []
+        for topic in topics:
+            ids = [self.token2id[w] for w in topic]
+            occ = self.occurrences[ids] / n
+            co = self.cooccurrences[ids][:, ids].toarray() / n + EPSILON
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # normalized log ratio of each pair of words
+                nlr = np.log(co / np.outer(occ, occ)) / -np.log(co)
+                # each word against the whole topic, with cosine similarity
+                topic_vector = nlr.sum(axis=0)
+                sims = (nlr @ topic_vector
+                        / (np.sqrt((nlr ** 2).sum(axis=1))
+                           * np.sqrt((topic_vector ** 2).sum())))
+            coherences.append(np.mean(sims))
+
+        return coherences
+
+    def c_v(self, topics, windows):
+        """
+        Computes the c_v coherence of a model as the mean of the coherence
+        of its topics
+
+        :param topics: the top words of each topic. See c_v_per_topic
+        :type topics: list[list[str]]
+        :param windows: number of windows of the documents used
+        :type windows: int
+        :return: the coherence
+        :rtype: float
+        """
+        return np.mean(self.c_v_per_topic(topics, windows))
@@ -0,0 +1,191 @@
+"""
+Topics assigned to the documents by a LDA model.
+
+The docs-topics association is saved in json as a list of records, one for
+each document. It can also be saved as a compact binary artifact: the
+docs x topics matrix in a numpy .npy file, that is loaded with memory
+mapping, and a small metadata index in a json file with the .meta extension.
+The records are built only for the documents actually used.
+"""
+import json
+import math
+import pathlib
+
+import numpy as np
+
+# extension of the binary docs x topics matrix
+MATRIX_SUFFIX = '.npy'
+# extension of the metadata index of the binary matrix
+META_SUFFIX = '.meta'
+
+
+class DocsTopics:
+    """
+    Topics assigned to the documents
+
+    The matrix attribute is the docs x topics matrix of the probability of
+    each topic in each document. The rows of the empty documents are zeros.
+    The records of the docs-topics association saved in json are built only
+    when they are needed: the object is a sequence of records.
+    """
+
+    def __init__(self, matrix, empty, titles, min_probability):
+        """
+        :param matrix: the docs x topics matrix of the topic probabilities
+        :type matrix: np.ndarray
+        :param empty: True for each document empty after the filtering
+        :type empty: np.ndarray
+        :param titles: the titles of the documents
+        :type titles: list[str]
+        :param min_probability: the topics with a lower probability are not
+            assigned to a document
+        :type min_probability: float
+        """
+        self.matrix = matrix
+        self.empty = empty
+        self.titles = titles
+        self.min_probability = min_probability
+        num_topics = matrix.shape[1]
+        topics_n_digit = math.floor(math.log10(num_topics) + 1)
+        self.topic_keys = [f'{i:0{topics_n_digit}d}'
+                           for i in range(num_topics)]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __getitem__(self, i):
+        return self.record(i)
+
+    def __iter__(self):
+        return (self.record(i) for i in range(len(self)))
+
+    def topics(self, i):
+        """
+        Gives the topics of a document
+
+        :param i: index of the document
+        :type i: int
+        :return: the topics of the document, from the most probable, with
+            their probabilities
+        :rtype: dict[str, float]
+        """
+        if self.empty[i]:
+            return {}
+
+        probs = np.asarray(self.matrix[i])
+        order = np.argsort(-probs, kind='stable')
+        probs = probs.tolist()
+        return {self.topic_keys[t]: probs[t] for t in order
+                if probs[t] >= self.min_probability}
+
+    def record(self, i):
+        """
+        Builds the record of a document of the docs-topics association
+
+        :param i: index of the document
+        :type i: int
+        :return: the id, the title, the topics and the empty flag of the
+            document
+        :rtype: dict[str, int or bool or str or dict[str, float]]
+        """
+        return {
+            'id': i,
+            'title': self.titles[i],
+            'topics': self.topics(i),
+            'empty': bool(self.empty[i]),
+        }
+
+    def to_records(self):
+        """
+        Builds the docs-topics association
+
+        :return: the records of all the documents, see record
+        :rtype: list[dict[str, int or bool or str or dict[str, float]]]
+        """
+        return list(self)
+
+    def save(self, path):
+        """
+        Saves the binary docs x topics matrix and its metadata index
+
+        The matrix is saved in path with the MATRIX_SUFFIX extension, and the
+        metadata in path with the META_SUFFIX extension.
+
+        :param path: path of the files, without the extension
+        :type path: pathlib.Path
+        """
+        np.save(path.with_name(path.name + MATRIX_SUFFIX),
+                np.ascontiguousarray(self.matrix))
+        meta = {
+            'min_probability': self.min_probability,
+            'titles': list(self.titles),
+            'empty': np.flatnonzero(self.empty).tolist(),
+        }
+        with open(path.with_name(path.name + META_SUFFIX), 'w') as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a binary docs x topics matrix and its metadata index
+
+        The matrix is memory mapped, so only the rows used are read.
+
+        :param path: path of the files, without the extension
+        :type path: pathlib.Path
+        :return: the loaded docs-topics association
+        :rtype: DocsTopics
+        :raise FileNotFoundError: if one of the files is missing
+        """
+        with open(path.with_name(path.name + META_SUFFIX)) as file:
+            meta = json.load(file)
+
+        matrix = np.load(path.with_name(path.name + MATRIX_SUFFIX),
+                         mmap_mode='r')
+        empty = np.zeros(len(meta['titles']), dtype=bool)
+        empty[meta['empty']] = True
+        return cls(matrix, empty, meta['titles'], meta['min_probability'])
+
+
+def docs_topics_paths(json_path):
+    """
+    Gives the files of the docs-topics association saved by lda.py
+
+    :param json_path: path to the json file with the docs-topics association
+    :type json_path: str or pathlib.Path
+    :return: the json file and, if they exist, the binary matrix and its
+        metadata index
+    :rtype: list[pathlib.Path]
+    """
+    json_path = pathlib.Path(json_path)
+    binary = json_path.with_suffix('')
+    paths = [json_path]
+    for suffix in (MATRIX_SUFFIX, META_SUFFIX):
+        path = binary.with_name(binary.name + suffix)
+        if path.is_file():
+            paths.append(path)
+
+    return paths
+
+
+def load_docs_topics(json_path):
+    """
+    Loads the docs-topics association saved by lda.py
+
+    If the binary matrix saved with the json file exists, it is loaded instead
+    of the json file.
+
+    :param json_path: path to the json file with the docs-topics association
+    :type json_path: str or pathlib.Path
+    :return: the docs-topics association, as a sequence of records
+    :rtype: DocsTopics or list[dict]
+    :raise FileNotFoundError: if the json file is needed and it is missing
+    """
+    json_path = pathlib.Path(json_path)
+    binary = json_path.with_suffix('')
+    if (binary.with_name(binary.name + MATRIX_SUFFIX).is_file()
+            and binary.with_name(binary.name + META_SUFFIX).is_file()):
+        return DocsTopics.load(binary)
+
+    with open(json_path) as file:
+        return json.load(file)
@@ -1,13 +1,29 @@
 import csv
 import logging
+import os
 import pathlib
+import pickle
 import sys
+import tempfile
+from multiprocessing import Pool
 
+import numpy as np
 import pandas
+from psutil import cpu_count
 
 from slrkit_utils.argument_parser import ArgParse
 from utils import setup_logger, STOPWORD_PLACEHOLDER, assert_column
 
+PHYSICAL_CPUS = cpu_count(logical=False)
+# the first occurrence of an n-gram in a shard is shard_index << SHARD_SHIFT
+# plus its position in the shard, so the positions of different shards are
+# ordered as the shards
+SHARD_SHIFT = 40
+# shard counters with more n-grams than this are saved to disk
+SPILL_THRESHOLD = 1000000
+# maximum number of documents in a shard
+SHARD_MAX_DOCS = 50000
+
 
 def to_record(config):
     """
@@ -54,12 +70,424 @@ def init_argparser():
                         default='\t',
                         help='Delimiter used in datafile. '
                              'Default %(default)r')
+    parser.add_argument('--no-parallel', action='store_true',
+                        help='Do not run in parallel')
     parser.add_argument('--logfile', default='slr-kit.log',
                         help='log file name. If omitted %(default)r is used',
                         logfile=True)
     return parser
 
 
+def tokenize_corpus(corpus, placeholder=None, relevant_prefix=None):
+    """
+    Tokenizes the corpus into an array of integer ids
+
+    The words of all the documents are concatenated in a single array of ids.
+    The returned vocabulary maps each id to its word.
+    The valid array tells, for each position, if the word can be part of an
+    n-gram, i.e. it is not the placeholder and it does not start with the
+    relevant_prefix.
+    The doc_end array contains, for each position, the position after the last
+    word of the document that contains that position.
+
+    :param corpus: the documents to tokenize
+    :type corpus: list[str]
+    :param placeholder: placeholder for the stop-words
+    :type placeholder: str or None
+    :param relevant_prefix: prefix used to mark the relevant terms
+    :type relevant_prefix: str or None
+    :return: the tuple (ids, vocabulary, valid, doc_end)
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """
+    tokens = []
+    lengths = np.empty(len(corpus), dtype=np.int64)
+    for i, doc in enumerate(corpus):
+        words = doc.split()  # default separator is the whitespace char
+        tokens.extend(words)
+        lengths[i] = len(words)
+
+    ids, vocabulary = pandas.factorize(np.array(tokens, dtype=object))
+    ids = ids.astype(np.int64, copy=False)
+    vocabulary = np.asarray(vocabulary, dtype=object)
+    invalid_words = np.fromiter((w == placeholder
+                                 or (relevant_prefix is not None
+                                     and w.startswith(relevant_prefix))
+                                 for w in vocabulary),
+                                dtype=bool, count=len(vocabulary))
+    valid = ~invalid_words[ids]
+    doc_end = np.repeat(np.cumsum(lengths), lengths)
+    return ids, vocabulary, valid, doc_end
+
+
+def count_n_grams(ids, valid, doc_end, n_max, offset=0):
+    """
+    Generator that counts the n-grams of a tokenized corpus
+
+    All the n-grams from 1 to n_max words are counted in a single pass for each
+    length. An n-gram is counted only if it is inside a document and all its
+    words are valid. Each n-gram is identified with a packed integer key
+    computed from the key of its first n - 1 words and the id of its last word,
+    and the keys are made dense after each length.
+    For each length, the generator yields two arrays: the position of the first
+    occurrence of each n-gram and the number of its occurrences. The n-grams
+    are ordered by first occurrence. The positions are shifted by offset.
+
+    :param ids: the ids of the words of the corpus
+    :type ids: np.ndarray
+    :param valid: for each position, if the word can be part of an n-gram
+    :type valid: np.ndarray
+    :param doc_end: for each position, the end of its document
+    :type doc_end: np.ndarray
+    :param n_max: maximum length of an n-gram in number of words
+    :type n_max: int
+    :param offset: offset added to the positions of the first occurrences
+    :type offset: int
+    :return: a generator that yields the tuple (first, counts) for each length
+        from 1 to n_max
+    :rtype: Generator[tuple[np.ndarray, np.ndarray], Any, None]
+    """
+    total = len(ids)
+    vocab_size = int(ids.max()) + 1 if total else 1
+    # number of invalid words before each position
+    bad = np.concatenate(([0], np.cumsum(~valid)))
+    positions = np.arange(total, dtype=np.int64)
+    prev_keys = None
+    for n in range(1, n_max + 1):
+        starts = positions[:max(total - n + 1, 0)]
+        ok = (starts + n <= doc_end[starts]) & (bad[starts + n] == bad[starts])
+        starts = starts[ok]
+        if n == 1:
+            packed = ids[starts]
+        else:
+            packed = prev_keys[starts] * vocab_size + ids[starts + n - 1]
+
+        # the codes are assigned in order of first occurrence
+        codes, uniques = pandas.factorize(packed)
+        counts = np.bincount(codes, minlength=len(uniques))
+        run_max = np.maximum.accumulate(codes) if len(codes) else codes
+        first_idx = np.flatnonzero(np.diff(run_max, prepend=-1) > 0)
+        # dense key of each n-gram, by position, used by the next length
+        prev_keys = np.full(total, -1, dtype=np.int64)
+        prev_keys[starts] = codes
+        yield starts[first_idx] + offset, counts
+
+
+def n_gram_strings(first, n, ids, vocabulary, offset=0):
+    """
+    Converts the n-grams to strings using the position of one occurrence
+
+    :param first: the positions of one occurrence of each n-gram
+    :type first: np.ndarray
+    :param n: the length of the n-grams
+    :type n: int
+    :param ids: the ids of the words of the corpus
+    :type ids: np.ndarray
+    :param vocabulary: the word of each id
+    :type vocabulary: np.ndarray
+    :param offset: offset to subtract from the positions
+    :type offset: int
+    :return: the n-grams as strings with the words separated by a space
+    :rtype: list[str]
+    """
+    pos = first - offset
+    words = [vocabulary[ids[pos + k]] for k in range(n)]
+    return [' '.join(w) for w in zip(*words)]
+
+
+def sort_n_grams(terms, counts, first, min_frequency):
+    """
+    Filters and sorts the n-grams
+
+    The n-grams with less than min_frequency occurrences are discarded. The
+    others are sorted by descending frequency and then by position of their
+    first occurrence.
+
+    :param terms: the n-grams
+    :type terms: Sequence[str]
+    :param counts: the number of occurrences of each n-gram
+    :type counts: np.ndarray
+    :param first: the position of the first occurrence of each n-gram
+    :type first: np.ndarray
+    :param min_frequency: min. number of occurrences
+    :type min_frequency: int
+    :return: the n-grams as a dict with the n-gram itself as the key and its
+        frequency as the value
+    :rtype: dict[str, int]
+    """
+    sel = np.flatnonzero(counts >= min_frequency)
+    order = sel[np.lexsort((first[sel], -counts[sel]))]
+    return {terms[i]: int(counts[i]) for i in order}
+
+
+def get_all_n_grams(corpus, n_max=4, min_frequency=5, placeholder=None,
+                    relevant_prefix=None):
+    """
+    Extracts the n-grams from 1 to n_max words from the corpus.
+
+    The corpus is tokenized only once. See get_n_grams for the details about
+    the n-grams extracted for each length.
+
+    :param corpus: the text to extract terms from
+    :type corpus: list[str]
+    :param n_max: maximum length of an n-gram in number of words
+    :type n_max: int
+    :param min_frequency: min. number of occurrences. n-grams with less than
+        this frequency are discarded
+    :type min_frequency: int
+    :param placeholder: placeholder for the stop-words. No n-gram with this
+        placeholder is returned
+    :type placeholder: str or None
+    :param relevant_prefix: prefix used to mark the relevant terms. No n-gram
+        containing a word with this prefix is returned
+    :type relevant_prefix: str or None
+    :return: for each length from 1 to n_max, the n-grams as a dict with the
+        n-gram itself as the key and its frequency as the value
+    :rtype: list[dict[str, int]]
+    """
+    ids, vocabulary, valid, doc_end = tokenize_corpus(corpus, placeholder,
+                                                      relevant_prefix)
+    list_of_grams = []
+    for n, (first, counts) in enumerate(count_n_grams(ids, valid, doc_end,
+                                                      n_max), start=1):
+        # the frequency is checked before converting the n-grams to strings
+        sel = np.flatnonzero(counts >= min_frequency)
+        first = first[sel]
+        counts = counts[sel]
+        terms = n_gram_strings(first, n, ids, vocabulary)
+        list_of_grams.append(sort_n_grams(terms, counts, first, min_frequency))
+
+    return list_of_grams
+
+
+def _spill(counters, spill_dir):
+    """
+    Saves the counters to disk if they are too big
+
+    :param counters: the counters as returned by count_shard
+    :type counters: dict[str, Any]
+    :param spill_dir: directory where the counters are saved
+    :type spill_dir: str
+    :return: the counters or the path of the file where they are saved
+    :rtype: dict[str, Any] or str
+    """
+    if sum(len(c) for c in counters['counts']) <= SPILL_THRESHOLD:
+        return counters
+
+    fd, path = tempfile.mkstemp(suffix='.pickle', dir=spill_dir)
+    with os.fdopen(fd, 'wb') as file:
+        pickle.dump(counters, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return path
+
+
+def _load(counters):
+    """
+    Loads the counters saved by _spill
+
+    The file is removed after loading.
+
+    :param counters: the counters or the path of the file where they are saved
+    :type counters: dict[str, Any] or str
+    :return: the counters
+    :rtype: dict[str, Any]
+    """
+    if not isinstance(counters, str):
+        return counters
+
+    with open(counters, 'rb') as file:
+        loaded = pickle.load(file)
+
+    os.remove(counters)
+    return loaded
+
+
+def count_shard(shard_index, corpus, n_max, placeholder, relevant_prefix,
+                spill_dir):
+    """
+    Counts all the n-grams of a shard of the corpus
+
+    No frequency filter is applied, so the counts of different shards can be
+    merged exactly with merge_counters.
+    The counters are a dict with the following items:
+    * 'vocabulary': array with the word of each id;
+    * 'ids': for each length n, a matrix with the n word ids of each n-gram;
+    * 'counts': for each length, the number of occurrences of each n-gram;
+    * 'first': for each length, the position of the first occurrence of each
+      n-gram. The position is shard_index << SHARD_SHIFT plus the position in
+      the shard.
+
+    :param shard_index: index of the shard
+    :type shard_index: int
+    :param corpus: the documents of the shard
+    :type corpus: list[str]
+    :param n_max: maximum length of an n-gram in number of words
+    :type n_max: int
+    :param placeholder: placeholder for the stop-words
+    :type placeholder: str or None
+    :param relevant_prefix: prefix used to mark the relevant terms
+    :type relevant_prefix: str or None
+    :param spill_dir: directory where the big counters are saved
+    :type spill_dir: str
+    :return: the counters or the path of the file where they are saved
+    :rtype: dict[str, Any] or str
+    """
+    offset = shard_index << SHARD_SHIFT
+    ids, vocabulary, valid, doc_end = tokenize_corpus(corpus, placeholder,
+                                                      relevant_prefix)
+    counters = {'vocabulary': vocabulary, 'ids': [], 'counts': [],
+                'first': []}
+    for n, (first, counts) in enumerate(count_n_grams(ids, valid, doc_end,
+                                                      n_max, offset=offset),
+                                        start=1):
+        pos = first - offset
+        counters['ids'].append(np.stack([ids[pos + k] for k in range(n)],
+                                        axis=1))
+        counters['counts'].append(counts)
+        counters['first'].append(first)
+
+    return _spill(counters, spill_dir)
+
+
+def merge_counters(counters1, counters2, spill_dir, min_frequency=None):
+    """
+    Merges the counters of two adjacent groups of shards
+
+    The shards of counters1 must precede the ones of counters2.
+    The counts are summed and the first occurrence is the earliest one.
+
+    :param counters1: the first counters, as returned by count_shard
+    :type counters1: dict[str, Any] or str
+    :param counters2: the second counters, as returned by count_shard
+    :type counters2: dict[str, Any] or str
+    :param spill_dir: directory where the big counters are saved
+    :type spill_dir: str
+    :param min_frequency: if not None, the n-grams with less occurrences are
+        discarded after the merge
+    :type min_frequency: int or None
+    :return: the merged counters or the path of the file where they are saved
+    :rtype: dict[str, Any] or str
+    """
+    c1 = _load(counters1)
+    c2 = _load(counters2)
+    # translates the word ids of c2 to the ids of the merged vocabulary
+    vocab1 = c1['vocabulary']
+    mapping = pandas.Index(vocab1).get_indexer(c2['vocabulary'])
+    new_words = np.flatnonzero(mapping == -1)
+    mapping[new_words] = len(vocab1) + np.arange(len(new_words))
+    vocabulary = np.concatenate((vocab1, c2['vocabulary'][new_words]))
+    vocab_size = max(len(vocabulary), 1)
+    merged = {'vocabulary': vocabulary, 'ids': [], 'counts': [], 'first': []}
+    for ids1, ids2, counts1, counts2, first1, first2 in zip(c1['ids'],
+                                                            c2['ids'],
+                                                            c1['counts'],
+                                                            c2['counts'],
+                                                            c1['first'],
+                                                            c2['first']):
+        ids = np.concatenate((ids1, mapping[ids2]))
+        counts = np.concatenate((counts1, counts2))
+        first = np.concatenate((first1, first2))
+        # dense key of each n-gram, assigned in order of appearance
+        codes = ids[:, 0]
+        for k in range(1, ids.shape[1]):
+            codes, _ = pandas.factorize(codes * vocab_size + ids[:, k])
+
+        if ids.shape[1] == 1:
+            codes, _ = pandas.factorize(codes)
+
+        # the rows of c1 come first and precede the ones of c2, so the first
+        # row of each n-gram has its earliest occurrence
+        run_max = np.maximum.accumulate(codes) if len(codes) else codes
+        first_idx = np.flatnonzero(np.diff(run_max, prepend=-1) > 0)
+        total = np.bincount(codes, weights=counts,
+                            minlength=len(first_idx)).astype(np.int64)
+        ids = ids[first_idx]
+        first = first[first_idx]
+        if min_frequency is not None:
+            sel = total >= min_frequency
+            ids = ids[sel]
+            total = total[sel]
+            first = first[sel]
+
+        merged['ids'].append(ids)
+        merged['counts'].append(total)
+        merged['first'].append(first)
+
+    return _spill(merged, spill_dir)
+
+
+def get_all_n_grams_parallel(corpus, n_max=4, min_frequency=5,
+                             placeholder=None, relevant_prefix=None,
+                             processes=PHYSICAL_CPUS):
+    """
+    Extracts the n-grams from 1 to n_max words from the corpus in parallel.
+
+    The corpus is split in shards of contiguous documents, one for each worker
+    or more if the corpus is very large, and all the n-grams of each shard are
+    counted by a worker. With only one shard, get_all_n_grams is used. The
+    counters of the shards are merged in pairs, in parallel, until only one is
+    left, and only then the n-grams with less than min_frequency occurrences
+    are discarded. The big counters are saved to disk while they wait to be
+    merged.
+    The result is the same of get_all_n_grams.
+
+    :param corpus: the text to extract terms from
+    :type corpus: list[str]
+    :param n_max: maximum length of an n-gram in number of words
+    :type n_max: int
+    :param min_frequency: min. number of occurrences. n-grams with less than
+        this frequency are discarded
+    :type min_frequency: int
+    :param placeholder: placeholder for the stop-words. No n-gram with this
+        placeholder is returned
+    :type placeholder: str or None
+    :param relevant_prefix: prefix used to mark the relevant terms. No n-gram
+        containing a word with this prefix is returned
+    :type relevant_prefix: str or None
+    :param processes: number of worker processes
+    :type processes: int
+    :return: for each length from 1 to n_max, the n-grams as a dict with the
+        n-gram itself as the key and its frequency as the value
+    :rtype: list[dict[str, int]]
+    """
+    num_shards = max(processes, -(-len(corpus) // SHARD_MAX_DOCS))
+    num_shards = min(num_shards, len(corpus))
+    if num_shards <= 1:
+        return get_all_n_grams(corpus, n_max, min_frequency, placeholder,
+                               relevant_prefix)
+
+    bounds = np.linspace(0, len(corpus), num_shards + 1).astype(int)
+    with tempfile.TemporaryDirectory() as spill_dir, \
+            Pool(processes=processes) as pool:
+        shards = ((i, corpus[bounds[i]:bounds[i + 1]], n_max, placeholder,
+                   relevant_prefix, spill_dir) for i in range(num_shards))
+        counters = pool.starmap(count_shard, shards)
+        # tree reduction: the counters are merged in pairs, keeping the order
+        while len(counters) > 1:
+            last = len(counters) == 2
+            pairs = [(counters[i], counters[i + 1], spill_dir,
+                      min_frequency if last else None)
+                     for i in range(0, len(counters) - 1, 2)]
+            merged = pool.starmap(merge_counters, pairs)
+            if len(counters) % 2 == 1:
+                merged.append(counters[-1])
+
+            counters = merged
+
+        counters = _load(counters[0])
+
+    list_of_grams = []
+    vocabulary = counters['vocabulary']
+    for ids, counts, first in zip(counters['ids'], counters['counts'],
+                                  counters['first']):
+        sel = np.flatnonzero(counts >= min_frequency)
+        words = vocabulary[ids[sel]]
+        terms = [' '.join(w) for w in words]
+        list_of_grams.append(sort_n_grams(terms, counts[sel], first[sel],
+                                          min_frequency))
+
+    return list_of_grams
+
+
 def get_n_grams(corpus, n_terms=1, min_frequency=5, placeholder=None,
                 relevant_prefix=None):
     """
@@ -67,6 +495,8 @@ def get_n_grams(corpus, n_terms=1, min_frequency=5, placeholder=None,
 
     The output is a dict of n-grams, where each dict item key
     is the n-gram and the value its the frequency, sorted by frequency.
+    The n-grams with the same frequency are sorted by their first occurrence
+    in the corpus.
 
     :param corpus: the text to extract terms from
     :type corpus: list[str]
@@ -85,31 +515,8 @@ def get_n_grams(corpus, n_terms=1, min_frequency=5, placeholder=None,
         frequency as the value
     :rtype: dict[str, int]
     """
-    terms = {}
-    if relevant_prefix is None:
-        # no prefix, use something that startswith can't find
-        relevant_prefix = ' '
-
-    for doc in corpus:
-        doc_list = doc.split()  # default separator is the whitespace char
-        for i in range(len(doc_list) - n_terms + 1):
-            words = doc_list[i:i+n_terms]
-            # skip the terms that contain a placeholder or a relevant term
-            if any(word == placeholder or word.startswith(relevant_prefix)
-                   for word in words):
-                continue
-
-            term = ' '.join(words)
-            if term in terms:
-                terms[term] += 1
-            else:
-                terms[term] = 1
-
-    limited_terms = {k: v for k, v in terms.items() if v >= min_frequency}
-    sorted_dict = {k: v for k, v in sorted(limited_terms.items(),
-                                           key=lambda item: item[1],
-                                           reverse=True)}
-    return sorted_dict
+    return get_all_n_grams(corpus, n_terms, min_frequency, placeholder,
+                           relevant_prefix)[-1]
 
 
 def convert_int_parameter(args, arg_name, default=None):
@@ -161,12 +568,16 @@ def gen_terms(args):
     placeholder = args.placeholder
     relevant_prefix = placeholder
 
-    list_of_grams = []
-    for n in range(1, n_grams + 1):
-        top_terms = get_n_grams(corpus, n_terms=n, min_frequency=min_frequency,
-                                placeholder=placeholder,
-                                relevant_prefix=relevant_prefix)
-        list_of_grams.append(top_terms)
+    if args.no_parallel:
+        list_of_grams = get_all_n_grams(corpus, n_max=n_grams,
+                                        min_frequency=min_frequency,
+                                        placeholder=placeholder,
+                                        relevant_prefix=relevant_prefix)
+    else:
+        list_of_grams = get_all_n_grams_parallel(corpus, n_max=n_grams,
+                                                 min_frequency=min_frequency,
+                                                 placeholder=placeholder,
+                                                 relevant_prefix=relevant_prefix)
 
     path = pathlib.Path(args.output)
     out = path.stem
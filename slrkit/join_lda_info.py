@@ -1,6 +1,8 @@
 import json
 import argparse
 
+from docs_topics import load_docs_topics
+
 
 def init_argparser():
     """
@@ -16,7 +18,8 @@ def init_argparser():
                              'terms and topics.')
     parser.add_argument('docs_topics', action="store", type=str,
                         help='JSON file containing the association between docs'
-                             ' and topics.')
+                             ' and topics. If the binary matrix saved with it '
+                             'exists, the matrix is used.')
     parser.add_argument('--output', '-o', action="store", type=str,
                         help='Output file')
     return parser
@@ -29,7 +32,7 @@ def join_lda_info(loaded_topics, docs, output):
     :param loaded_topics: information about the topics
     :type loaded_topics: dict
     :param docs: association between documents and topics
-    :type docs: list[dict]
+    :type docs: list[dict] or DocsTopics
     :param output: output file. If None, stdout is used
     :type output: str or None
     """
@@ -75,8 +78,7 @@ def main():
     with open(terms_topics) as topics_file:
         loaded_topics = json.load(topics_file)
 
-    with open(docs_topics) as docs_file:
-        docs = json.load(docs_file)
+    docs = load_docs_topics(docs_topics)
 
     join_lda_info(loaded_topics, docs, output)
 
@@ -10,28 +10,45 @@ if not sys.warnoptions:
     import warnings
     warnings.simplefilter('ignore')
 
+import functools
+import hashlib
+import itertools
 import json
 import math
 import logging
 from datetime import datetime
+from multiprocessing import Pool
 from pathlib import Path
+from timeit import default_timer as timer
 
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from gensim.corpora import Dictionary
+from gensim.matutils import dirichlet_expectation
 from gensim.models import LdaModel
-from gensim.models.coherencemodel import CoherenceModel
 from psutil import cpu_count
 
 from slrkit_utils.argument_parser import ArgParse
-from utils import assert_column
+from coherence import CoherenceIndex, model_topics, num_windows
+from utils import assert_column, log_pool_times, pool_chunksize
 from join_lda_info import join_lda_info
+from docs_topics import DocsTopics
 
 PHYSICAL_CPUS = cpu_count(logical=False)
 MIN_ALPHA_VAL = 1e-20
 
+# maximum number of (word, topic) pairs of a batch of infer_docs_topics
+INFERENCE_MAX_ENTRIES = 2 ** 22
+# name of the file with the documents used by a saved model
+MODEL_DOCUMENTS = 'model_documents.npz'
+
+# model used by the workers of the sharded E-step
+_estep_model = None
+
 
 def to_ignore(_):
-    return ['lda*.json', 'lda_info*.txt']
+    return ['lda*.json', 'lda_info*.txt', 'lda*.npy', 'lda*.meta']
 
 
 def init_argparser():
@@ -83,6 +100,14 @@ def init_argparser():
                                           'omitted %(default)s is used')
     parser.add_argument('--seed', type=int, default=123,
                         help='Seed to be used in training. Default %(default)r')
+    parser.add_argument('--passes', type=int, default=1,
+                        help='Number of passes through the corpus during the '
+                             'training. Default %(default)r')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes used in training. If 0, '
+                             'all the physical cores are used. The same seed '
+                             'and number of workers give the same model. '
+                             'Default %(default)r')
     parser.add_argument('--model', action='store_true',
                         help='if set, the lda model is saved to directory '
                              '<outdir>/lda_model. The model is saved '
@@ -93,9 +118,25 @@ def init_argparser():
                              'named "model" is searched. the loaded model is '
                              'used with the dataset file to generate the topics'
                              ' and the topic document association')
+    parser.add_argument('--update', action='store_true',
+                        help='if set, the model loaded with --load-model is '
+                             'updated with the documents not used to train '
+                             'it. The topics are inferred only for these '
+                             'documents. The new terms are filtered using '
+                             'no_below and no_above on the new documents')
+    parser.add_argument('--max-new-terms', type=int, default=1000,
+                        help='maximum number of new terms added to the '
+                             'dictionary of the model updated with --update. '
+                             'The terms are chosen by number of new '
+                             'documents containing them. Default %(default)r')
     parser.add_argument('--no_timestamp', action='store_true',
                         help='if set, no timestamp is added to the topics file '
                              'names')
+    parser.add_argument('--binary-topics', action='store_true',
+                        help='if set, the topics assigned to each document '
+                             'are also saved as a numpy matrix, used instead '
+                             'of the json file by the report and by '
+                             'join_lda_info')
     parser.add_argument('--delimiter', action='store', type=str,
                         default='\t', help='Delimiter used in preproc_file. '
                                            'Default %(default)r')
@@ -155,7 +196,7 @@ def prepare_corpus(docs, no_above, no_below):
 
 
 def train_lda_model(docs, topics=20, alpha='auto', beta='auto', no_above=0.5,
-                    no_below=20, seed=None):
+                    no_below=20, seed=None, passes=1, workers=1):
     """
     Trains the lda model
 
@@ -177,6 +218,11 @@ def train_lda_model(docs, topics=20, alpha='auto', beta='auto', no_above=0.5,
     :type no_below: int
     :param seed: seed used for random generator
     :type seed: int or None
+    :param passes: number of passes through the corpus during the training
+    :type passes: int
+    :param workers: number of processes used in training. If greater than 1,
+        the E-step is split between the processes, see sharded_estep
+    :type workers: int
     :return: the trained model and the dictionary object used in training
     :rtype: tuple[LdaModel, Dictionary]
     """
@@ -188,17 +234,16 @@ def train_lda_model(docs, topics=20, alpha='auto', beta='auto', no_above=0.5,
     # filter the empty documents
     bows = [c for c in corpus if c != []]
     # Train LDA model.
+    kwargs = dict(id2word=id2word, chunksize=len(corpus), alpha=alpha,
+                  eta=beta, num_topics=topics, random_state=seed,
+                  passes=passes, minimum_probability=0.0)
+    workers = min(workers, len(bows))
+    start = timer()
     try:
-        model = LdaModel(
-            corpus=bows,
-            id2word=id2word,
-            chunksize=len(corpus),
-            alpha=alpha,
-            eta=beta,
-            num_topics=topics,
-            random_state=seed,
-            minimum_probability=0.0
-        )
+        if workers > 1:
+            model = LdaModel(**kwargs)
+        else:
+            model = LdaModel(corpus=bows, **kwargs)
     except ValueError as err:
         if 'alpha' in err.args[0]:
             msg = 'Invalid value {!r} for parameter alpha'.format(alpha)
@@ -207,13 +252,268 @@ def train_lda_model(docs, topics=20, alpha='auto', beta='auto', no_above=0.5,
         else:
             raise
         sys.exit(msg)
+
+    if workers > 1:
+        logger = logging.getLogger('debug_logger')
+        compute_time = []
+        # the model is sent to the workers before the estep is replaced,
+        # because the pool cannot be pickled
+        with Pool(processes=workers, initializer=init_estep,
+                  initargs=(model,)) as pool:
+            model.do_estep = functools.partial(sharded_estep, model, pool,
+                                               workers, compute_time)
+            try:
+                model.update(bows)
+            finally:
+                del model.do_estep
+
+        log_pool_times(logger, 'sharded_estep', workers, timer() - start,
+                       sum(compute_time))
+
+    print(f'Model trained in {timer() - start:.2f} s with {workers} '
+          f'process(es)')
     return model, dictionary
 
 
-def prepare_topics(model, docs, titles, dictionary):
+class _FixedGamma:
+    """
+    Random state that gives a precomputed initialization of gamma
+
+    LdaModel.inference draws the initialization of gamma from its random
+    state. With this object, inference uses the values drawn by the main
+    process for the whole chunk.
+    """
+
+    def __init__(self, gamma):
+        self._gamma = gamma
+
+    def gamma(self, shape, scale, size):
+        return self._gamma
+
+
+def init_estep(model):
+    global _estep_model
+    _estep_model = model
+
+
+def estep_shard(args):
+    """
+    Performs the E-step on a shard of a chunk
+
+    :param args: the documents of the shard, the initialization of their
+        gamma, the expElogbeta and the alpha of the model
+    :type args: tuple[list[list[tuple[int, int]]], np.ndarray, np.ndarray,
+        np.ndarray]
+    :return: the gamma and the sufficient statistics of the shard, and the
+        time spent computing them
+    :rtype: tuple[np.ndarray, np.ndarray, float]
+    """
+    start = timer()
+    shard, gamma, exp_elogbeta, alpha = args
+    _estep_model.expElogbeta = exp_elogbeta
+    _estep_model.alpha = alpha
+    _estep_model.random_state = _FixedGamma(gamma)
+    gamma, sstats = _estep_model.inference(shard, collect_sstats=True)
+    return gamma, sstats, timer() - start
+
+
+def sharded_estep(model, pool, workers, compute_time, chunk, state=None):
+    """
+    Replacement of LdaModel.do_estep that splits the chunk between workers
+
+    The initialization of gamma is drawn for the whole chunk in the main
+    process, as LdaModel.inference does, so the random state of the model
+    evolves as in the single process training. Each worker computes the gamma
+    and the sufficient statistics of a contiguous shard, and the statistics
+    are summed in the order of the shards, so the result does not depend on
+    the scheduling of the workers.
+
+    :param model: the model in training
+    :type model: LdaModel
+    :param pool: the pool of workers, initialized with init_estep
+    :type pool: Pool
+    :param workers: number of workers of the pool
+    :type workers: int
+    :param compute_time: list where the compute time of each shard is appended
+    :type compute_time: list[float]
+    :param chunk: the documents of the chunk
+    :type chunk: list[list[tuple[int, int]]]
+    :param state: the state updated with the sufficient statistics. If None,
+        the state of the model is used
+    :type state: gensim.models.ldamodel.LdaState or None
+    :return: the gamma of the documents of the chunk
+    :rtype: np.ndarray
+    """
+    if state is None:
+        state = model.state
+    chunk = list(chunk)
+    gamma = model.random_state.gamma(100., 1. / 100.,
+                                     (len(chunk), model.num_topics))
+    gamma = gamma.astype(model.dtype, copy=False)
+    size = pool_chunksize(len(chunk), workers, chunks_per_worker=1)
+    tasks = [(chunk[i:i + size], gamma[i:i + size], model.expElogbeta,
+              model.alpha) for i in range(0, len(chunk), size)]
+    gammas = []
+    for g, sstats, t in pool.map(estep_shard, tasks):
+        state.sstats += sstats
+        gammas.append(g)
+        compute_time.append(t)
+
+    state.numdocs += len(chunk)
+    return np.concatenate(gammas)
+
+
+def docs_to_bows(docs, dictionary):
+    """
+    Converts the documents in bag-of-words with a single pass on the corpus
+
+    The tokens of all the documents are mapped to their ids at once, and the
+    counts of each (document, id) pair are computed on the whole corpus, as
+    the rows of a sparse matrix. The bag-of-words of each document is a view
+    of the rows of the matrix, and it is equal to the one returned by
+    dictionary.doc2bow.
+
+    :param docs: the tokenized documents
+    :type docs: list[list[str]]
+    :param dictionary: the gensim dictionary object
+    :type dictionary: Dictionary
+    :return: the bag-of-words of each document, as an array of (id, count)
+        rows sorted by id
+    :rtype: list[np.ndarray]
+    """
+    lengths = np.fromiter((len(d) for d in docs), dtype=np.int64,
+                          count=len(docs))
+    vocabulary = pd.Index(list(dictionary.token2id.keys()), dtype=object)
+    vocab_ids = np.fromiter(dictionary.token2id.values(), dtype=np.int64,
+                            count=len(vocabulary))
+    codes = vocabulary.get_indexer(list(itertools.chain.from_iterable(docs)))
+    doc = np.repeat(np.arange(len(docs), dtype=np.int64), lengths)
+    keep = codes >= 0
+    size = max(len(dictionary), int(vocab_ids.max(initial=0)) + 1)
+    keys, counts = np.unique(doc[keep] * size + vocab_ids[codes[keep]],
+                             return_counts=True)
+    rows = np.column_stack([keys % size, counts])
+    indptr = np.searchsorted(keys // size,
+                             np.arange(len(docs) + 1, dtype=np.int64))
+    return [rows[indptr[i]:indptr[i + 1]] for i in range(len(docs))]
+
+
+def _infer_batch(model, bows):
+    """
+    Computes the gamma of a batch of documents with a vectorized E-step
+
+    The E-step of LdaModel.inference is performed on all the documents at the
+    same time, with the same initialization, updates and convergence check of
+    each document. The documents that converge are removed from the batch.
+
+    :param model: the trained lda model
+    :type model: LdaModel
+    :param bows: the bag-of-words of the documents. They must not be empty
+    :type bows: list[np.ndarray]
+    :return: the docs x topics gamma of the documents
+    :rtype: np.ndarray
+    """
+    dtype = model.dtype
+    lengths = np.fromiter((len(b) for b in bows), dtype=np.int64,
+                          count=len(bows))
+    entries = np.concatenate(bows)
+    words = entries[:, 0]
+    counts = entries[:, 1].astype(dtype)
+    # the words x topics matrix, and its rows for each (document, word) pair
+    topics_words = np.ascontiguousarray(model.expElogbeta.T)
+    exp_elogbeta = topics_words[words]
+    epsilon = np.finfo(dtype).eps
+    gamma = model.random_state.gamma(100., 1. / 100.,
+                                     (len(bows), model.num_topics))
+    gamma = gamma.astype(dtype, copy=False)
+    exp_elogtheta = np.exp(dirichlet_expectation(gamma))
+    result = np.empty_like(gamma)
+    # position in the batch of the documents not converged
+    active = np.arange(len(bows))
+    for _ in range(model.iterations):
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        phinorm = np.einsum('ij,ij->i',
+                            np.repeat(exp_elogtheta, lengths, axis=0),
+                            exp_elogbeta) + epsilon
+        ratio = sparse.csr_matrix((counts / phinorm, words, indptr),
+                                  shape=(len(lengths), len(topics_words)))
+        last_gamma = gamma
+        gamma = model.alpha + exp_elogtheta * (ratio @ topics_words)
+        exp_elogtheta = np.exp(dirichlet_expectation(gamma))
+        converged = (np.mean(np.abs(gamma - last_gamma), axis=1)
+                     < model.gamma_threshold)
+        if converged.any():
+            result[active[converged]] = gamma[converged]
+            keep = ~converged
+            entries_keep = np.repeat(keep, lengths)
+            words = words[entries_keep]
+            counts = counts[entries_keep]
+            exp_elogbeta = exp_elogbeta[entries_keep]
+            lengths = lengths[keep]
+            gamma = gamma[keep]
+            exp_elogtheta = exp_elogtheta[keep]
+            active = active[keep]
+            if len(active) == 0:
+                break
+
+    result[active] = gamma
+    return result
+
+
+def infer_docs_topics(model, bows, max_entries=INFERENCE_MAX_ENTRIES):
+    """
+    Computes the topic probabilities of the documents with a batched E-step
+
+    The documents are split in batches with about max_entries (word, topic)
+    pairs, and the E-step is performed on each batch at once. The
+    initialization of the E-step is drawn from the random state of the model
+    as if model.get_document_topics was called on each document in order, so
+    the result is the same, but for the rounding errors.
+
+    :param model: the trained lda model
+    :type model: LdaModel
+    :param bows: the bag-of-words of the documents as returned by
+        docs_to_bows. They must not be empty
+    :type bows: list[np.ndarray]
+    :param max_entries: maximum number of (word, topic) pairs of a batch
+    :type max_entries: int
+    :return: the docs x topics matrix of the topic probabilities
+    :rtype: np.ndarray
+    """
+    gamma = np.empty((len(bows), model.num_topics), dtype=model.dtype)
+    batch_words = max(max_entries // model.num_topics, 1)
+    start = 0
+    while start < len(bows):
+        end = start
+        words = 0
+        while end < len(bows) and (end == start
+                                   or words + len(bows[end]) <= batch_words):
+            words += len(bows[end])
+            end += 1
+        gamma[start:end] = _infer_batch(model, bows[start:end])
+        start = end
+
+    # normalizes each row as get_document_topics: the topics are summed in
+    # order, in double precision, and the sum is rounded to the dtype of gamma
+    norm = gamma[:, 0].astype(np.float64)
+    for i in range(1, model.num_topics):
+        norm += gamma[:, i]
+
+    return gamma / norm.astype(gamma.dtype)[:, np.newaxis]
+
+
+def prepare_topics(model, docs, titles, dictionary, coherence_index=None,
+                   known_topics=None):
     """
     Prepare the dicts for the topics and the document topic assignment
 
+    The topics of all the documents are computed at once, see
+    infer_docs_topics. The documents with a row in known_topics keep it.
+    The c_v coherence of the topics is computed on the documents not empty
+    after the filtering of the dictionary. If coherence_index is None, the
+    statistics of the top words of the topics are computed on these documents.
+
     :param model: the trained lda model
     :type model: LdaModel
     :param docs: the documents to evaluate to assign the topics
@@ -222,41 +522,44 @@ def prepare_topics(model, docs, titles, dictionary):
     :type titles: list[str]
     :param dictionary: the gensim dictionary object used for training
     :type dictionary: Dictionary
+    :param coherence_index: the precomputed statistics of the corpus used to
+        compute the coherence. It must index all the words of the dictionary
+    :type coherence_index: CoherenceIndex or None
+    :param known_topics: docs x topics matrix with the probabilities of the
+        topics of the documents that are not inferred again. The rows of the
+        other documents are NaN
+    :type known_topics: np.ndarray or None
     :return: the dict of the topics, the docs-topics assignement and
         the average coherence score
     :rtype: tuple[dict[int, dict[str, str or dict[str, float]]],
-        list[dict[str, int or bool or str or dict[int, str]]], float]
+        DocsTopics, float]
     """
-    docs_topics = []
-    not_empty_docs = []
-    topics_n_digit = math.floor(math.log10(model.num_topics) + 1)
-    for i, (title, d) in enumerate(zip(titles, docs)):
-        bow = dictionary.doc2bow(d)
-        isempty = False
-        if bow:
-            t = model.get_document_topics(bow)
-            t.sort(key=lambda x: x[1], reverse=True)
-            not_empty_docs.append(d)
-        else:
-            # document is empty after the filtering so no topics
-            t = []
-            isempty = True
-        d_t = {
-            'id': i,
-            'title': title,
-            'topics': {f'{tu[0]:0{topics_n_digit}d}': float(tu[1]) for tu in t},
-            'empty': isempty
-        }
-        docs_topics.append(d_t)
+    bows = docs_to_bows(docs, dictionary)
+    empty = np.array([len(b) == 0 for b in bows], dtype=bool)
+    matrix = np.zeros((len(docs), model.num_topics), dtype=model.dtype)
+    infer = ~empty
+    if known_topics is not None:
+        known = infer & ~np.isnan(known_topics).any(axis=1)
+        matrix[known] = known_topics[known]
+        infer &= ~known
+    matrix[infer] = infer_docs_topics(model, [b for b, i in zip(bows, infer)
+                                              if i])
+    # same threshold of get_document_topics
+    docs_topics = DocsTopics(matrix, empty, titles,
+                             max(model.minimum_probability, 1e-8))
+    not_empty_docs = [d for d, e in zip(docs, empty) if not e]
 
-    cm = CoherenceModel(model=model, texts=not_empty_docs,
-                        dictionary=dictionary,
-                        coherence='c_v', processes=1)  # PHYSICAL_CPUS)
+    topics_n_digit = math.floor(math.log10(model.num_topics) + 1)
+    top_words = model_topics(model)
+    if coherence_index is None:
+        coherence_index = CoherenceIndex(
+            not_empty_docs, words=itertools.chain.from_iterable(top_words))
 
+    coherence = coherence_index.c_v_per_topic(top_words,
+                                              num_windows(not_empty_docs))
     # Average topic coherence is the sum of topic coherences of all topics,
     # divided by the number of topics.
-    avg_topic_coherence = cm.get_coherence()
-    coherence = cm.get_coherence_per_topic()
+    avg_topic_coherence = np.mean(coherence)
     topics = {}
     topics_order = list(range(model.num_topics))
     topics_order.sort(key=lambda x: coherence[x], reverse=True)
@@ -273,6 +576,181 @@ def prepare_topics(model, docs, titles, dictionary):
     return topics, docs_topics, avg_topic_coherence
 
 
+def fingerprint_docs(docs):
+    """
+    Computes a fingerprint of the tokens of each document
+
+    The fingerprints do not depend on PYTHONHASHSEED.
+
+    :param docs: the tokenized documents
+    :type docs: list[list[str]]
+    :return: the fingerprint of each document
+    :rtype: np.ndarray
+    """
+    return np.array([int.from_bytes(hashlib.blake2b('\x00'.join(d).encode(),
+                                                    digest_size=8).digest(),
+                                    'little')
+                     for d in docs], dtype=np.uint64)
+
+
+def save_model(model, dictionary, docs, docs_topics, lda_path):
+    """
+    Saves a model, its dictionary and the topics of its documents
+
+    The fingerprints and the topics of the documents are saved in the
+    MODEL_DOCUMENTS file, so the model can be updated with the documents not
+    used to train it.
+
+    :param model: the trained lda model
+    :type model: LdaModel
+    :param dictionary: the gensim dictionary object used for training
+    :type dictionary: Dictionary
+    :param docs: the documents used to train the model
+    :type docs: list[list[str]]
+    :param docs_topics: the topics of the documents
+    :type docs_topics: DocsTopics
+    :param lda_path: path of the directory where the files are saved
+    :type lda_path: Path
+    """
+    lda_path.mkdir(exist_ok=True)
+    model.save(str(lda_path / 'model'))
+    dictionary.save(str(lda_path / 'model_dictionary'))
+    np.savez(lda_path / MODEL_DOCUMENTS, fingerprints=fingerprint_docs(docs),
+             topics=docs_topics.matrix, empty=docs_topics.empty)
+
+
+def load_known_topics(lda_path, docs):
+    """
+    Loads the topics of the documents already used by a saved model
+
+    :param lda_path: path of the directory of the saved model
+    :type lda_path: Path
+    :param docs: the documents
+    :type docs: list[list[str]]
+    :return: the docs x topics matrix with the topics of the documents used
+        by the model. The rows of the new documents, and of the documents
+        that were empty, are NaN
+    :rtype: np.ndarray
+    :raise FileNotFoundError: if the model has no MODEL_DOCUMENTS file
+    """
+    with np.load(lda_path / MODEL_DOCUMENTS) as saved:
+        rows = {f: i for i, (f, e) in enumerate(zip(saved['fingerprints'],
+                                                     saved['empty']))
+                if not e}
+        topics = saved['topics']
+
+    known = np.full((len(docs), topics.shape[1]), np.nan, dtype=topics.dtype)
+    for i, f in enumerate(fingerprint_docs(docs)):
+        if f in rows:
+            known[i] = topics[rows[f]]
+
+    return known
+
+
+def extend_dictionary(dictionary, new_docs, no_below, no_above,
+                      max_new_terms):
+    """
+    Adds the terms of new documents to a dictionary
+
+    Only the terms contained in at least no_below new documents and in no more
+    than no_above fraction of the new documents are added, at most
+    max_new_terms of them, choosing the ones in more documents. The ids of
+    the terms already in the dictionary do not change.
+
+    :param dictionary: the gensim dictionary object to extend
+    :type dictionary: Dictionary
+    :param new_docs: the new documents
+    :type new_docs: list[list[str]]
+    :param no_below: minimum number of new documents containing a new term
+    :type no_below: int
+    :param no_above: maximum fraction of new documents containing a new term
+    :type no_above: float
+    :param max_new_terms: maximum number of terms added
+    :type max_new_terms: int
+    :return: the number of terms added
+    :rtype: int
+    """
+    num_terms = len(dictionary)
+    candidates = Dictionary(new_docs)
+    candidates.filter_extremes(no_below=no_below, no_above=no_above,
+                               keep_n=None)
+    new_terms = [t for t in candidates.token2id
+                 if t not in dictionary.token2id]
+    new_terms.sort(key=lambda t: (-candidates.dfs[candidates.token2id[t]], t))
+    accepted = set(new_terms[:max(max_new_terms, 0)])
+    dictionary.add_documents(new_docs)
+    # the ids of the new terms follow the ones of the old terms, and the
+    # filter keeps the order of the ids
+    dictionary.filter_tokens(bad_ids=[i for t, i in dictionary.token2id.items()
+                                      if i >= num_terms and t not in accepted])
+    _ = dictionary[0]  # This is only to "load" the dictionary.
+    return len(dictionary) - num_terms
+
+
+def extend_model(model, dictionary):
+    """
+    Adds the new terms of its dictionary to a trained model
+
+    The new terms have the mean prior of the old terms and no sufficient
+    statistics, so their probability in each topic is given by the prior
+    until the model is updated.
+
+    :param model: the trained lda model
+    :type model: LdaModel
+    :param dictionary: the dictionary of the model, with the new terms after
+        the old ones
+    :type dictionary: Dictionary
+    """
+    new_terms = len(dictionary) - model.num_terms
+    eta = model.eta
+    new_eta = np.full(eta.shape[:-1] + (new_terms,),
+                      eta.mean(axis=-1, keepdims=True), dtype=eta.dtype)
+    model.eta = np.concatenate([eta, new_eta], axis=-1)
+    model.state.eta = model.eta
+    model.state.sstats = np.concatenate(
+        [model.state.sstats,
+         np.zeros((model.num_topics, new_terms), dtype=model.dtype)], axis=1)
+    model.num_terms = len(dictionary)
+    model.id2word = dictionary.id2token
+    model.sync_state()
+
+
+def update_model(model, dictionary, new_docs, no_below, no_above,
+                 max_new_terms):
+    """
+    Updates online a trained model with new documents
+
+    The dictionary and the model are extended with the new terms, see
+    extend_dictionary, then the model is updated with the bag-of-words of the
+    new documents.
+
+    :param model: the trained lda model
+    :type model: LdaModel
+    :param dictionary: the gensim dictionary object used for training
+    :type dictionary: Dictionary
+    :param new_docs: the documents not used to train the model
+    :type new_docs: list[list[str]]
+    :param no_below: see extend_dictionary
+    :type no_below: int
+    :param no_above: see extend_dictionary
+    :type no_above: float
+    :param max_new_terms: see extend_dictionary
+    :type max_new_terms: int
+    """
+    added = extend_dictionary(dictionary, new_docs, no_below, no_above,
+                              max_new_terms)
+    if added > 0:
+        extend_model(model, dictionary)
+
+    bows = [b for b in docs_to_bows(new_docs, dictionary) if len(b)]
+    print(f'Updating the model with {len(bows)} new documents and {added} '
+          f'new terms')
+    if bows:
+        start = timer()
+        model.update(bows)
+        print(f'Model updated in {timer() - start:.2f} s')
+
+
 def load_documents(preproc_file, target_col, title_col,
                    delimiter):
     try:
@@ -292,7 +770,7 @@ def load_documents(preproc_file, target_col, title_col,
 
 
 def output_topics(topics, docs_topics, outdir, file_prefix, uid,
-                  use_timestamp=True):
+                  use_timestamp=True, binary=False):
     """
     Saves the topics and docs-topics association to json files
 
@@ -302,10 +780,13 @@ def output_topics(topics, docs_topics, outdir, file_prefix, uid,
     Also outputs the file <outdir>/<file_prefix>_info_<timestamp>.txt with all
     the information about topics and documents joined in a single file.
     This file is in the format produced by the join_lda_info.py.
+    If binary is True, the docs-topics association is also saved as a binary
+    matrix, see DocsTopics.save, in
+    <outdir>/<file_prefix>_docs-topics_<timestamp>.npy.
     :param topics: dict of the topics as returned by prepare_topics
     :type topics: dict[int, dict[str, str or dict[str, float]]]
     :param docs_topics: docs-topics association as returned by prepare_topics
-    :type docs_topics: list[dict[str, int or bool or str or dict[int, str]]]
+    :type docs_topics: DocsTopics
     :param outdir: where to save the files
     :type outdir: Path
     :param file_prefix: prefix of the files
@@ -314,6 +795,8 @@ def output_topics(topics, docs_topics, outdir, file_prefix, uid,
     :type uid: str
     :param use_timestamp: if True (the default) add a timestamp to file names
     :type use_timestamp: bool
+    :param binary: if True, the binary docs-topics matrix is also saved
+    :type binary: bool
     """
     if use_timestamp:
         now = datetime.now()
@@ -325,13 +808,17 @@ def output_topics(topics, docs_topics, outdir, file_prefix, uid,
     with open(topic_file, 'w') as file:
         json.dump(topics, file, indent='\t')
 
-    name = f'{file_prefix}_docs-topics{timestamp}_{uid}.json'
-    docs_file = outdir / name
+    name = f'{file_prefix}_docs-topics{timestamp}_{uid}'
+    if binary:
+        docs_topics.save(outdir / name)
+
+    records = docs_topics.to_records()
+    docs_file = outdir / f'{name}.json'
     with open(docs_file, 'w') as file:
-        json.dump(docs_topics, file, indent='\t')
+        json.dump(records, file, indent='\t')
 
     info_file = outdir / f'{file_prefix}_info{timestamp}_{uid}.txt'
-    join_lda_info(topics, docs_topics, str(info_file))
+    join_lda_info(topics, records, str(info_file))
 
 
 def save_toml_files(args, results_df, result_dir):
@@ -339,7 +826,8 @@ def save_toml_files(args, results_df, result_dir):
     Saves the toml files that will be used to load the models in lda.py
 
     The toml file are saved in <outdir>/toml. If this directory not exists, it
-    is created.
+    is created. If the model of a result is not saved, the toml file has the
+    parameters and the seed used to train it again.
     :param args: cli arguments.
         Must have preproc_file, terms_file, outdir as Path. target_colum, title,
         placeholder, delimiter as str. The meaning of these attributes is the
@@ -352,6 +840,9 @@ def save_toml_files(args, results_df, result_dir):
     """
     toml_dir = result_dir / 'toml'
     toml_dir.mkdir(exist_ok=True)
+    trained = results_df['same_as'].isna() | (results_df['same_as'] == '')
+    passes = dict(zip(results_df.loc[trained, 'uuid'],
+                      results_df.loc[trained, 'passes']))
     for _, row in results_df.iterrows():
         conf = tomlkit.document()
         conf.add('postproc_file', str(args.postproc_file))
@@ -363,13 +854,21 @@ def save_toml_files(args, results_df, result_dir):
         conf.add('beta', row['beta'])
         conf.add('no_below', row['no_below'])
         conf.add('no_above', row['no_above'])
-        if row['seed'] is None:
+        if pd.isna(row['seed']):
             conf.add('seed', '')
         else:
-            conf.add('seed', row['seed'])
-        conf.add('model', False)
+            conf.add('seed', int(row['seed']))
         u = row['uuid']
-        conf.add('load-model', str(result_dir / 'models' / u))
+        # a duplicate uses the model of the individual it duplicates
+        model_u = u if u in passes else row['same_as']
+        if passes.get(model_u, 0) > 0:
+            conf.add('passes', int(passes[model_u]))
+        conf.add('model', False)
+        model_path = result_dir / 'models' / model_u
+        if (model_path / 'model').is_file():
+            conf.add('load-model', str(model_path))
+        else:
+            conf.add('load-model', '')
         conf.add('delimiter', args.delimiter)
         with open(toml_dir / ''.join([u, '.toml']), 'w') as file:
             file.write(tomlkit.dumps(conf))
@@ -386,15 +885,26 @@ def lda(args):
                                   args.title,
                                   args.delimiter)
 
+    known_topics = None
+    if args.update and args.load_model is None:
+        sys.exit('Error: the --update option requires the --load-model option')
+
     if args.load_model is not None:
         lda_path = Path(args.load_model)
         try:
             model = LdaModel.load(str(lda_path / 'model'))
             dictionary = Dictionary.load(str(lda_path / 'model_dictionary'))
+            if args.update:
+                known_topics = load_known_topics(lda_path, docs)
         except FileNotFoundError as err:
             msg = 'Error: file {!r} not found'
             sys.exit(msg.format(err.filename))
 
+        if args.update:
+            new_docs = [d for d, k in zip(docs, known_topics)
+                        if np.isnan(k).any()]
+            update_model(model, dictionary, new_docs, args.no_below,
+                         args.no_above, args.max_new_terms)
     else:
         no_below = args.no_below
         no_above = args.no_above
@@ -412,23 +922,23 @@ def lda(args):
             beta = args.beta
 
         seed = args.seed
+        workers = args.workers if args.workers > 0 else PHYSICAL_CPUS
         model, dictionary = train_lda_model(docs, topics, alpha, beta,
-                                            no_above, no_below, seed)
+                                            no_above, no_below, seed,
+                                            args.passes, workers)
 
-    topics, docs_topics, avg_topic_coherence = prepare_topics(model, docs,
-                                                              titles,
-                                                              dictionary)
+    topics, docs_topics, avg_topic_coherence = prepare_topics(
+        model, docs, titles, dictionary, known_topics=known_topics)
 
     print(f'Average topic coherence: {avg_topic_coherence:.4f}.')
     u = str(uuid.uuid4())
     output_topics(topics, docs_topics, output_dir, 'lda', u,
-                  use_timestamp=not args.no_timestamp)
+                  use_timestamp=not args.no_timestamp,
+                  binary=args.binary_topics)
 
     if args.model:
-        lda_path: Path = args.outdir / 'lda_model'
-        lda_path.mkdir(exist_ok=True)
-        model.save(str(lda_path / 'model'))
-        dictionary.save(str(lda_path / 'model_dictionary'))
+        save_model(model, dictionary, docs, docs_topics,
+                   args.outdir / 'lda_model')
 
 
 def main():
@@ -1,14 +1,18 @@
 import csv
 import dataclasses
+import heapq
 import logging
+import os
 import pathlib
+import pickle
+import queue
 import random
 import shutil
 import sys
-import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from multiprocessing import Pool, Manager
+from multiprocessing import Pool
 from pathlib import Path
 from timeit import default_timer as timer
 from typing import Optional, List, Union, ClassVar, Dict, Tuple
@@ -25,24 +29,36 @@ if not sys.warnoptions:
     warnings.simplefilter('ignore')
 
 from gensim.corpora import Dictionary
-from gensim.models import CoherenceModel, LdaModel
+from gensim.models import LdaModel
+from gensim.models.callbacks import Metric
 
 from slrkit_utils.argument_parser import ArgParse
+from coherence import CoherenceIndex, model_topics, num_windows
 from lda import (PHYSICAL_CPUS, MIN_ALPHA_VAL,
-                 prepare_topics, output_topics, save_toml_files,
-                 load_documents)
+                 prepare_topics, output_topics, save_model,
+                 save_toml_files, load_documents)
 from utils import setup_logger
 
 EPSILON = 1e-7
+# number of passes of a full training
+LDA_PASSES = 10
+# name of the file with the state of the GA in the results directory
+CHECKPOINT_FILE = 'checkpoint.pickle'
+# name of the table with the records of all the evaluations
+RESULTS_TABLE = 'evaluations.csv'
+# maximum number of bag-of-words entries kept in the filter cache of a worker
+FILTER_CACHE_SIZE = 1000000
 
 logger = None
 
 # these globals are used by the multiprocess workers used in compute_optimal_model
 _corpus: Optional[List[List[str]]] = None
+_encoded: Optional['EncodedCorpus'] = None
+_filter_cache: Optional['FilterCache'] = None
+_coherence_index: Optional[CoherenceIndex] = None
 _titles: Optional[List[str]] = None
 _seed: Optional[int] = None
 _modeldir: Optional[pathlib.Path] = None
-_coherences: Optional[Dict[int, Tuple[Optional[float], str]]] = None
 
 creator.create('FitnessMax', base.Fitness, weights=(1.0,))
 
@@ -228,6 +244,33 @@ class LdaIndividual:
                                                         [0.6, 0.2, 0.2],
                                                         k=1)[0])
 
+    @classmethod
+    def from_result(cls, result):
+        """
+        Creates the individual described by a record of the results
+
+        :param result: the record of the results, as created by new_result
+        :type result: dict[str, Any] or pd.Series
+        :return: the individual
+        :rtype: LdaIndividual
+        :raise BoundsNotSetError: if the set_bounds method is not called first
+        """
+        alpha = result['alpha']
+        try:
+            alpha_val = float(alpha)
+            alpha_type = 0
+        except ValueError:
+            # the value is not used with the string alphas
+            alpha_val = 1.0
+            alpha_type = 1 if alpha == 'symmetric' else -1
+
+        return LdaIndividual(_topics=int(result['topics']),
+                             _alpha_val=alpha_val,
+                             _beta=float(result['beta']),
+                             _no_above=float(result['no_above']),
+                             _no_below=int(result['no_below']),
+                             _alpha_type=alpha_type)
+
     @property
     def topics(self):
         return self._topics
@@ -354,117 +397,715 @@ def init_argparser():
     parser.add_argument('--logfile', default='slr-kit.log',
                         help='log file name. If omitted %(default)r is used',
                         logfile=True)
+    parser.add_argument('--keep-models', metavar='N', type=int, default=0,
+                        help='number of models saved, the ones with the best '
+                             'coherence. The other models can be trained '
+                             'again using their toml file. If 0, all the '
+                             'models are saved. Default: %(default)r')
+    parser.add_argument('--resume', metavar='RESULT_DIR', type=Path,
+                        help='directory of the results of an interrupted '
+                             'optimization to resume. The optimization '
+                             'continues from the last completed generation '
+                             'using the GA parameters saved in that '
+                             'directory, and the individuals already '
+                             'evaluated are not trained again.')
     return parser
 
 
-def init_train(corpora, titles, seed, modeldir, coherences):
-    global _corpus, _titles, _seed, _modeldir, _coherences
+class EncodedCorpus:
+    """
+    Corpus encoded with the dictionary of all its words
+
+    The full dictionary, the document frequencies and the bag-of-words of each
+    document are computed only once, before the optimization. The filtered
+    dictionary and bag-of-words of each individual are derived from them
+    masking the words outside the no_below/no_above limits, with the same
+    results of Dictionary.filter_extremes and Dictionary.doc2bow.
+    The bag-of-words of all the documents are stored in flat arrays: the
+    entries of the i-th document are in the range doc_ptr[i]:doc_ptr[i + 1].
+    """
+
+    def __init__(self, corpus):
+        """
+        :param corpus: the tokenized documents
+        :type corpus: list[list[str]]
+        """
+        self.dictionary = Dictionary()
+        bows = [self.dictionary.doc2bow(doc, allow_update=True)
+                for doc in corpus]
+        self.num_docs = len(corpus)
+        size = len(self.dictionary)
+        self.tokens = [''] * size
+        for token, i in self.dictionary.token2id.items():
+            self.tokens[i] = token
+
+        self.dfs = np.zeros(size, dtype=np.int64)
+        self.cfs = np.zeros(size, dtype=np.int64)
+        for i, freq in self.dictionary.dfs.items():
+            self.dfs[i] = freq
+        for i, freq in self.dictionary.cfs.items():
+            self.cfs[i] = freq
+
+        lengths = np.fromiter((len(b) for b in bows), dtype=np.int64,
+                              count=len(bows))
+        self.doc_ptr = np.zeros(len(bows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.doc_ptr[1:])
+        self.ids = np.fromiter((i for b in bows for i, _ in b),
+                               dtype=np.int64, count=self.doc_ptr[-1])
+        self.counts = np.fromiter((c for b in bows for _, c in b),
+                                  dtype=np.int64, count=self.doc_ptr[-1])
+
+    def __len__(self):
+        return self.num_docs
+
+    def good_ids(self, no_below, no_above, keep_n=100000):
+        """
+        Gives the ids of the words kept by a filter, in increasing order
+
+        The selection is the same done by Dictionary.filter_extremes.
+
+        :param no_below: minimum number of documents of a word
+        :type no_below: int
+        :param no_above: maximum fraction of documents of a word
+        :type no_above: float
+        :param keep_n: maximum number of words kept, the most frequent ones
+        :type keep_n: int
+        :return: the ids of the words kept
+        :rtype: np.ndarray
+        """
+        no_above_abs = int(no_above * self.num_docs)
+        good = np.flatnonzero((self.dfs >= no_below)
+                              & (self.dfs <= no_above_abs))
+        if len(good) > keep_n:
+            # filter_extremes uses a stable sort by decreasing frequency
+            order = np.argsort(-self.dfs[good], kind='stable')
+            good = np.sort(good[order[:keep_n]])
+
+        return good
+
+    def filter_key(self, no_below, no_above):
+        """
+        Gives the key that identifies the result of a filter
+
+        Two filters with the same key keep the same words.
+
+        :param no_below: minimum number of documents of a word
+        :type no_below: int
+        :param no_above: maximum fraction of documents of a word
+        :type no_above: float
+        :return: the key of the filter
+        :rtype: tuple[int, int]
+        """
+        return int(no_below), int(no_above * self.num_docs)
+
+    def filter(self, no_below, no_above):
+        """
+        Derives the filtered dictionary and bag-of-words of the corpus
+
+        :param no_below: minimum number of documents of a word
+        :type no_below: int
+        :param no_above: maximum fraction of documents of a word
+        :type no_above: float
+        :return: the filtered dictionary and the bag-of-words of each document.
+            The bag-of-words of a document without words is empty
+        :rtype: tuple[Dictionary, list[list[tuple[int, int]]]]
+        """
+        good = self.good_ids(no_below, no_above)
+        new_ids = range(len(good))
+        dictionary = Dictionary()
+        dictionary.token2id = dict(zip((self.tokens[i] for i in good),
+                                       new_ids))
+        dictionary.dfs = dict(zip(new_ids, self.dfs[good].tolist()))
+        dictionary.cfs = dict(zip(new_ids, self.cfs[good].tolist()))
+        dictionary.num_docs = self.dictionary.num_docs
+        dictionary.num_pos = self.dictionary.num_pos
+        dictionary.num_nnz = self.dictionary.num_nnz
+
+        # the new ids keep the order of the old ones, so the bows stay sorted
+        remap = np.full(len(self.dfs), -1, dtype=np.int64)
+        remap[good] = new_ids
+        mapped = remap[self.ids]
+        keep = mapped >= 0
+        pairs = list(zip(mapped[keep].tolist(), self.counts[keep].tolist()))
+        kept_before = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept_before[1:])
+        ptr = kept_before[self.doc_ptr].tolist()
+        bows = [pairs[ptr[i]:ptr[i + 1]] for i in range(self.num_docs)]
+        return dictionary, bows
+
+
+class FilterCache:
+    """
+    Bounded cache of the filtered dictionaries and bag-of-words of a corpus
+
+    The results are keyed by EncodedCorpus.filter_key. The size of the cache
+    is the total number of bag-of-words entries of the results it holds: when
+    it exceeds maxsize, the least recently used results are discarded. The
+    last result added is always kept.
+    """
+
+    def __init__(self, encoded, maxsize=FILTER_CACHE_SIZE):
+        """
+        :param encoded: the corpus to filter
+        :type encoded: EncodedCorpus
+        :param maxsize: maximum number of bag-of-words entries in the cache
+        :type maxsize: int
+        """
+        self.encoded = encoded
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def filter(self, no_below, no_above):
+        """
+        Gives the filtered dictionary and bag-of-words of the corpus
+
+        See EncodedCorpus.filter. The returned values are shared by all the
+        callers using the same filter, so they must not be modified.
+
+        :param no_below: minimum number of documents of a word
+        :type no_below: int
+        :param no_above: maximum fraction of documents of a word
+        :type no_above: float
+        :return: the filtered dictionary, the bag-of-words of each document
+            and if the result was found in the cache
+        :rtype: tuple[Dictionary, list[list[tuple[int, int]]], bool]
+        """
+        key = self.encoded.filter_key(no_below, no_above)
+        value = self._cache.get(key)
+        if value is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return value[0], value[1], True
+
+        self.misses += 1
+        dictionary, bows = self.encoded.filter(no_below, no_above)
+        size = sum(len(b) for b in bows)
+        self._cache[key] = (dictionary, bows, size)
+        self.size += size
+        while self.size > self.maxsize and len(self._cache) > 1:
+            _, (_, _, s) = self._cache.popitem(last=False)
+            self.size -= s
+
+        return dictionary, bows, False
+
+
+def init_train(corpora, encoded, coherence_index, titles, seed, modeldir):
+    global _corpus, _encoded, _filter_cache, _coherence_index
+    global _titles, _seed, _modeldir
     _corpus = corpora
+    _encoded = encoded
+    _filter_cache = FilterCache(encoded)
+    _coherence_index = coherence_index
     _titles = titles
     _seed = seed
     _modeldir = modeldir
-    _coherences = coherences
 
 
-# topics, alpha, beta, no_above, no_below label
-def evaluate(ind: LdaIndividual):
-    global _corpus, _titles, _seed, _modeldir, _coherences
-    logger = logging.getLogger('debug_logger')
-    u = str(uuid.uuid4())
-    logger.debug(f'{u}: started evaluation')
-    # unpack parameter
-    n_topics = int(ind.topics)
-    alpha = ind.alpha
-    beta = ind.beta
-    no_above = ind.no_above
-    no_below = int(ind.no_below)
+def new_result(ind, u, seed, num_docs):
+    """
+    Creates the record of the results of the evaluation of an individual
+
+    :param ind: the evaluated individual
+    :type ind: LdaIndividual
+    :param u: uuid of the evaluation
+    :type u: str
+    :param seed: seed used for the training
+    :type seed: int or None
+    :param num_docs: number of documents in the corpus
+    :type num_docs: int
+    :return: the record with the default values
+    :rtype: dict[str, Any]
+    """
     result = {}
     result['uuid'] = u
     result['coherence'] = -float('inf')
-    result['seed'] = _seed
-    result['num_docs'] = len(_corpus)
+    result['seed'] = seed
+    result['num_docs'] = num_docs
     result['num_not_empty'] = 0
-    result['topics'] = n_topics
-    result['alpha'] = alpha
-    result['beta'] = beta
-    result['no_above'] = no_above
-    result['no_below'] = no_below
+    result['topics'] = int(ind.topics)
+    result['alpha'] = ind.alpha
+    result['beta'] = ind.beta
+    result['no_above'] = ind.no_above
+    result['no_below'] = int(ind.no_below)
     result['saved_model'] = False
     result['same_as'] = ''
     result['time'] = 0
-    no_train = False
-    # check the cache
-    ind_hash = hash(ind)
+    result['passes'] = 0
+    return result
+
+
+def save_result(result, table):
+    """
+    Appends the record of the results to the results table
+
+    The header is written only if the table is created.
+
+    :param result: the record of the results
+    :type result: dict[str, Any]
+    :param table: path to the table of the results
+    :type table: pathlib.Path
+    """
+    new = not table.exists()
+    with open(table, 'a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(result.keys()))
+        if new:
+            writer.writeheader()
+        writer.writerow(result)
+
+
+class EarlyStopping(Exception):
+    pass
+
+
+class CoherenceTracker(Metric):
+    """
+    Tracks the coherence of a model after each pass of its training
+
+    It is used as a callback of LdaModel. If the coherence does not improve
+    for patience passes, the training is stopped raising EarlyStopping.
+    """
+
+    def __init__(self, coherence_index, windows, patience):
+        """
+        :param coherence_index: statistics of the corpus used to compute the
+            coherence
+        :type coherence_index: CoherenceIndex
+        :param windows: number of windows of the documents used for training
+        :type windows: int
+        :param patience: number of passes without improvement that stop the
+            training
+        :type patience: int
+        """
+        self.logger = None
+        self.title = 'Coherence'
+        self.coherence_index = coherence_index
+        self.windows = windows
+        self.patience = patience
+        self.values = []
+        self._best = -float('inf')
+        self._since_best = 0
+
+    def get_value(self, **kwargs):
+        model = kwargs['model']
+        value = self.coherence_index.c_v(model_topics(model), self.windows)
+        self.values.append(value)
+        if value > self._best:
+            self._best = value
+            self._since_best = 0
+        else:
+            self._since_best += 1
+            if self._since_best >= self.patience:
+                raise EarlyStopping()
+
+        return value
+
+
+def train_model(bows, dictionary, n_topics, alpha, beta, passes,
+                tracker=None):
+    """
+    Trains a lda model
+
+    :param bows: the bag-of-words of the documents
+    :type bows: list[list[tuple[int, int]]]
+    :param dictionary: the dictionary of the bows
+    :type dictionary: Dictionary
+    :param n_topics: number of topics
+    :type n_topics: int
+    :param alpha: alpha parameter
+    :type alpha: float or str
+    :param beta: beta parameter
+    :type beta: float
+    :param passes: number of passes
+    :type passes: int
+    :param tracker: if not None, the tracker used to stop the training early
+    :type tracker: CoherenceTracker or None
+    :return: the trained model and the number of passes done
+    :rtype: tuple[LdaModel, int]
+    """
+    kwargs = dict(num_topics=n_topics, id2word=dictionary,
+                  chunksize=len(bows), passes=passes, random_state=_seed,
+                  minimum_probability=0.0, alpha=alpha, eta=beta)
+    if tracker is None:
+        return LdaModel(bows, **kwargs), passes
+
+    # the corpus is passed after the creation to keep the model if the
+    # training is stopped
+    model = LdaModel(callbacks=[tracker], **kwargs)
     try:
-        cv = (None, '')
-        while cv[0] is None:
-            time.sleep(1)
-            cv = _coherences[ind_hash]
+        model.update(bows)
+    except EarlyStopping:
+        pass
+    # the tracker must not be saved with the model
+    model.callbacks = None
+    return model, len(tracker.values)
 
-        result['coherence'] = cv[0]
-        result['same_as'] = cv[1]
-        no_train = True
-    except KeyError:
-        _coherences[ind_hash] = (None, '')
+
+# topics, alpha, beta, no_above, no_below label
+def evaluate(ind: LdaIndividual, passes=LDA_PASSES, patience=0, u=None,
+             save_above=None):
+    """
+    Trains and evaluates the model of an individual
+
+    The duplicated individuals are never sent to this function, so each call
+    trains a model. See FitnessStore.
+    If patience is greater than 0, the coherence is computed after each pass
+    and the training stops when it does not improve for patience passes.
+    An individual already evaluated with fewer passes can be trained again
+    passing the uuid of its first evaluation: its model is replaced.
+    The model is saved in <modeldir>/<uuid> only if its coherence is greater
+    than save_above. The record of the results is saved by the caller.
+
+    :param ind: the individual to evaluate
+    :type ind: LdaIndividual
+    :param passes: number of passes of the training
+    :type passes: int
+    :param patience: number of passes without improvement of the coherence
+        that stop the training. If 0, the training is never stopped
+    :type patience: int
+    :param u: uuid of a previous evaluation of the individual to replace
+    :type u: str or None
+    :param save_above: if not None, the model is saved only if its coherence
+        is greater than this value
+    :type save_above: float or None
+    :return: the record of the results of the evaluation
+    :rtype: dict[str, Any]
+    """
+    global _corpus, _filter_cache, _coherence_index, _titles, _seed, _modeldir
+    logger = logging.getLogger('debug_logger')
+    replace = u is not None
+    if not replace:
+        u = str(uuid.uuid4())
+    logger.debug(f'{u}: started evaluation with {passes} passes')
+    # unpack parameter
+    n_topics = int(ind.topics)
+    alpha = ind.alpha
+    beta = ind.beta
+    no_above = ind.no_above
+    no_below = int(ind.no_below)
+    result = new_result(ind, u, _seed, len(_corpus))
+    no_train = False
     start = timer()
-    dictionary = Dictionary(_corpus)
     # Filter out words that occur less than no_above documents, or more than
     # no_below % of the documents.
-    dictionary.filter_extremes(no_below=no_below, no_above=no_above)
+    # the individuals with the same filter share the result
+    dictionary, bows, cached = _filter_cache.filter(no_below, no_above)
+    logger.debug(f'{u}: filter cache {"hit" if cached else "miss"} '
+                 f'(worker hits: {_filter_cache.hits}, '
+                 f'misses: {_filter_cache.misses}, '
+                 f'entries: {_filter_cache.size})')
     try:
         _ = dictionary[0]  # This is only to "load" the dictionary.
     except KeyError:
         no_train = True
 
     output_dir = _modeldir / u
-    output_dir.mkdir(exist_ok=True)
+    if replace:
+        # removes the model of the previous evaluation
+        shutil.rmtree(output_dir, ignore_errors=True)
     if not no_train:
         not_empty_bows = []
         not_empty_docs = []
         not_empty_titles = []
-        for i, c in enumerate(_corpus):
-            bow = dictionary.doc2bow(c)
+        for i, (c, bow) in enumerate(zip(_corpus, bows)):
             if bow:
                 not_empty_bows.append(bow)
                 not_empty_docs.append(c)
                 not_empty_titles.append(_titles[i])
 
         result['num_not_empty'] = len(not_empty_bows)
-        model = LdaModel(not_empty_bows, num_topics=n_topics,
-                         id2word=dictionary, chunksize=len(not_empty_bows),
-                         passes=10, random_state=_seed,
-                         minimum_probability=0.0, alpha=alpha, eta=beta)
-        # computes coherence score for that model
-        cv_model = CoherenceModel(model=model, texts=not_empty_docs,
-                                  dictionary=dictionary, coherence='c_v',
-                                  processes=1)
-        result['coherence'] = cv_model.get_coherence()
+        tracker = None
+        if patience > 0:
+            tracker = CoherenceTracker(_coherence_index,
+                                       num_windows(not_empty_docs), patience)
+        model, result['passes'] = train_model(not_empty_bows, dictionary,
+                                              n_topics, alpha, beta, passes,
+                                              tracker)
+        if tracker is not None:
+            values = ', '.join(f'{v:.5f}' for v in tracker.values)
+            logger.debug(f'{u}: coherence after each pass: {values}')
+        # computes coherence score for that model, using the statistics of
+        # the whole corpus: the empty documents do not contain any word of
+        # the dictionary, so they do not change the statistics of its words
+        topics, docs_topics, coherence = prepare_topics(model, not_empty_docs,
+                                                        not_empty_titles,
+                                                        dictionary,
+                                                        _coherence_index)
+        result['coherence'] = coherence
         stop = timer()
         result['time'] = stop - start
-        topics, docs_topics, _ = prepare_topics(model, not_empty_docs,
-                                                not_empty_titles, dictionary)
         # check for NaNs
         for t in topics.values():
             if any(np.isnan(p) for p in t['terms_probability'].values()):
                 result['coherence'] = -float('inf')
 
-        if not np.isinf(result['coherence']):
-            output_topics(topics, docs_topics, output_dir, 'lda',
-                          result['uuid'])
-
-        _coherences[ind_hash] = (result['coherence'], result['uuid'])
+        if save_above is None or result['coherence'] > save_above:
+            output_dir.mkdir(exist_ok=True)
+            if not np.isinf(result['coherence']):
+                output_topics(topics, docs_topics, output_dir, 'lda',
+                              result['uuid'])
 
-        model.save(str(output_dir / 'model'))
-        dictionary.save(str(output_dir / 'model_dictionary'))
-        result['saved_model'] = True
+            save_model(model, dictionary, not_empty_docs, docs_topics,
+                       output_dir)
+            result['saved_model'] = True
         logger.debug(f"{u}: evaluation completed")
 
-    with open(output_dir / 'results.csv', 'w') as file:
-        writer = csv.DictWriter(file, fieldnames=list(result.keys()))
-        writer.writeheader()
-        writer.writerow(result)
+    return result
+
+
+class SuccessiveHalving:
+    """
+    Promotion rule of the multi-fidelity evaluation of the individuals
+
+    Each individual is first trained with low_passes passes. Its coherence is
+    compared with the one of all the individuals trained with low_passes so
+    far, and only if it is in the best fraction given by promote, the
+    individual is trained again with all the passes. This is an asynchronous
+    version of the successive halving, with a single promotion.
+    """
+
+    def __init__(self, low_passes, promote):
+        """
+        :param low_passes: number of passes of the first training
+        :type low_passes: int
+        :param promote: fraction of the individuals trained again
+        :type promote: float
+        """
+        self.low_passes = low_passes
+        self.promote = promote
+        self._scores = []
+
+    def should_promote(self, result):
+        """
+        Decides if an individual must be trained with all the passes
+
+        :param result: the record of the results of the first training
+        :type result: dict[str, Any]
+        :return: True if the individual must be trained again
+        :rtype: bool
+        """
+        coherence = result['coherence']
+        if np.isnan(coherence):
+            coherence = -float('inf')
+        self._scores.append(coherence)
+        if np.isinf(coherence):
+            return False
+
+        better = sum(s > coherence for s in self._scores)
+        return better < self.promote * len(self._scores)
+
+
+class FitnessStore:
+    """
+    Store of the fitness of the evaluated individuals
+
+    The store lives in the parent process, and it is used to deduplicate the
+    individuals before they are sent to the workers: each distinct individual
+    (see LdaIndividual.__hash__) is trained only once. See dispatch.
+    An individual is pending from when its evaluation is started (reserve)
+    until its result is available (complete). The duplicates of a pending
+    individual are registered as waiters, and they receive the result when it
+    is completed, so no worker is ever blocked waiting for another one.
+    The duplicates are recorded in the results with the uuid of the
+    evaluation that trained their model in the 'same_as' field.
+    All the records are appended to the results table.
+    If keep_models is greater than 0, only the models with the best
+    keep_models coherences are kept: the other ones are removed as soon as
+    they are out of the best ones.
+    """
+
+    def __init__(self, modeldir, seed, num_docs, table, keep_models=0):
+        """
+        :param modeldir: path to the directory of the models
+        :type modeldir: pathlib.Path
+        :param seed: seed used for the training
+        :type seed: int or None
+        :param num_docs: number of documents in the corpus
+        :type num_docs: int
+        :param table: path to the table of the results
+        :type table: pathlib.Path
+        :param keep_models: number of models kept. If 0, all the models are
+            kept
+        :type keep_models: int
+        """
+        self.modeldir = modeldir
+        self.seed = seed
+        self.num_docs = num_docs
+        self.table = table
+        self.keep_models = keep_models
+        # individual hash -> (coherence, uuid)
+        self._results: Dict[int, Tuple[float, str]] = {}
+        # individual hash -> duplicated individuals waiting for the result
+        self._pending: Dict[int, List[LdaIndividual]] = {}
+        # min-heap of the (coherence, uuid) of the kept models
+        self._kept: List[Tuple[float, str]] = []
 
-    return (result['coherence'],)
+    def __len__(self):
+        return len(self._results)
+
+    @staticmethod
+    def key(ind):
+        return hash(ind)
+
+    def lookup(self, ind):
+        """
+        Gives the result of an individual, if already evaluated
+
+        :param ind: the individual
+        :type ind: LdaIndividual
+        :return: the tuple (coherence, uuid) or None
+        :rtype: tuple[float, str] or None
+        """
+        return self._results.get(self.key(ind))
+
+    def is_pending(self, ind):
+        return self.key(ind) in self._pending
+
+    def reserve(self, ind):
+        """
+        Marks an individual as pending
+
+        :param ind: the individual that is going to be evaluated
+        :type ind: LdaIndividual
+        """
+        self._pending.setdefault(self.key(ind), [])
+
+    def add_waiter(self, ind):
+        """
+        Registers a duplicate of a pending individual
+
+        The waiter receives its fitness when the pending individual is
+        completed.
+
+        :param ind: the duplicated individual
+        :type ind: LdaIndividual
+        """
+        self._pending[self.key(ind)].append(ind)
+
+    def complete(self, ind, result):
+        """
+        Stores the result of an individual and notifies its waiters
+
+        The fitness of the individual and of all its waiters is set.
+
+        :param ind: the evaluated individual
+        :type ind: LdaIndividual
+        :param result: the record of the results returned by evaluate
+        :type result: dict[str, Any]
+        :return: the waiters notified
+        :rtype: list[LdaIndividual]
+        """
+        k = self.key(ind)
+        value = (result['coherence'], result['uuid'])
+        save_result(result, self.table)
+        if result['saved_model']:
+            self.keep(result['coherence'], result['uuid'])
+        self._results[k] = value
+        ind.fitness.values = (value[0],)
+        waiters = self._pending.pop(k, [])
+        for w in waiters:
+            self.set_duplicate(w, value)
+
+        return waiters
+
+    def set_duplicate(self, ind, value):
+        """
+        Sets the fitness of a duplicated individual and records its results
+
+        :param ind: the duplicated individual
+        :type ind: LdaIndividual
+        :param value: the tuple (coherence, uuid) of the evaluated individual
+        :type value: tuple[float, str]
+        """
+        result = new_result(ind, str(uuid.uuid4()), self.seed, self.num_docs)
+        result['coherence'] = value[0]
+        result['same_as'] = value[1]
+        save_result(result, self.table)
+        ind.fitness.values = (value[0],)
+
+    def load(self, results):
+        """
+        Loads the results of the individuals trained in a previous run
+
+        :param results: the records of the results. The records of the
+            duplicated individuals are ignored
+        :type results: pd.DataFrame
+        """
+        trained = results['same_as'].isna() | (results['same_as'] == '')
+        for _, row in results[trained].iterrows():
+            ind = LdaIndividual.from_result(row)
+            self._results[self.key(ind)] = (float(row['coherence']),
+                                            row['uuid'])
+            if (self.modeldir / row['uuid'] / 'model').is_file():
+                self.keep(float(row['coherence']), row['uuid'])
+
+    def save_threshold(self):
+        """
+        Gives the coherence that a new model must exceed to be kept
+
+        :return: the coherence of the worst kept model, or None if the new
+            model is always kept
+        :rtype: float or None
+        """
+        if self.keep_models <= 0 or len(self._kept) < self.keep_models:
+            return None
+
+        return self._kept[0][0]
+
+    def keep(self, coherence, u):
+        """
+        Adds a saved model to the kept ones, removing the worst if needed
+
+        :param coherence: coherence of the model
+        :type coherence: float
+        :param u: uuid of the model
+        :type u: str
+        """
+        if self.keep_models <= 0:
+            return
+        if np.isnan(coherence):
+            coherence = -float('inf')
+
+        heapq.heappush(self._kept, (coherence, u))
+        while len(self._kept) > self.keep_models:
+            _, worst = heapq.heappop(self._kept)
+            shutil.rmtree(self.modeldir / worst, ignore_errors=True)
+
+    def dispatch(self, ind, record=True):
+        """
+        Decides if an individual must be trained
+
+        If the individual was already evaluated, its fitness is set. If it is
+        pending, it is registered as a waiter. Otherwise, it is reserved and
+        it must be sent to a worker, and then completed with its result.
+
+        :param ind: the individual to evaluate
+        :type ind: LdaIndividual
+        :param record: if False and the individual was already evaluated, its
+            record is not saved. Used for the individuals whose record was
+            saved before resuming a run
+        :type record: bool
+        :return: True if the individual must be trained
+        :rtype: bool
+        """
+        value = self.lookup(ind)
+        if value is not None:
+            if record:
+                self.set_duplicate(ind, value)
+            else:
+                ind.fitness.values = (value[0],)
+            return False
+        elif self.is_pending(ind):
+            self.add_waiter(ind)
+            return False
+
+        self.reserve(ind)
+        return True
 
 
 def check_bounds(val, min_, max_):
@@ -530,6 +1171,11 @@ def load_ga_params(ga_params):
             'mate': float(params['probabilities']['mate']),
             'no_filter': float(params['probabilities']['no_filter']),
         },
+        'fidelity': {
+            'low_passes': int(params['fidelity']['low_passes']),
+            'promote': float(params['fidelity']['promote']),
+            'patience': int(params['fidelity']['patience']),
+        },
         'mutate': {}
     }
     for sec in params['mutate']:
@@ -550,22 +1196,281 @@ def load_ga_params(ga_params):
         raise ValueError('The sum of the crossover and mutation probabilities '
                          'must be <= 1.0')
 
+    if not 0 <= params['fidelity']['low_passes'] < LDA_PASSES:
+        raise ValueError(f'fidelity.low_passes must be a value between 0 and '
+                         f'{LDA_PASSES - 1}')
+
+    if not 0 < params['fidelity']['promote'] <= 1.0:
+        raise ValueError('fidelity.promote must be a value between 0 '
+                         '(excluded) and 1')
+
+    if params['fidelity']['patience'] < 0:
+        raise ValueError('fidelity.patience must be >= 0')
+
     return params
 
 
-def collect_results(outdir):
-    results = []
-    for p in outdir.glob('*/results.csv'):
-        results.append(pd.read_csv(p))
-        p.unlink()
+def collect_results(table, modeldir):
+    """
+    Loads the results table, sorted from the best saved model
+
+    The saved_model field is set according to the models still saved in
+    modeldir.
 
-    df = pd.concat(results)
+    :param table: path to the table of the results
+    :type table: pathlib.Path
+    :param modeldir: path to the directory of the models
+    :type modeldir: pathlib.Path
+    :return: the records of the results
+    :rtype: pd.DataFrame
+    """
+    df = pd.read_csv(table, float_precision='round_trip')
+    df['saved_model'] = [(modeldir / u / 'model').is_file()
+                         for u in df['uuid']]
     df.sort_values(by=['saved_model', 'coherence'],
                    ascending=[False, False], inplace=True)
     df.reset_index(drop=True, inplace=True)
     return df
 
 
+def ea_steady_state(population, toolbox, store, pool, processes, mu, lambda_,
+                    cxpb, mutpb, ngen, stats=None, verbose=True,
+                    checkpoint=None, state=None, fidelity=None,
+                    record_initial=True):
+    """
+    Asynchronous steady-state version of the DEAP eaMuPlusLambda algorithm
+
+    The same operators of eaMuPlusLambda are used, but the workers never wait
+    for the end of a generation: as soon as a worker is free, a new offspring
+    is created with varOr from the evaluated individuals of the current
+    population and sent to it. Each time lambda_ offspring have their fitness,
+    the population is replaced selecting mu individuals from the population
+    and these offspring. This is a generation, and ngen generations are done,
+    so the number of offspring is the same of eaMuPlusLambda.
+    The individuals are deduplicated by the store, so only the new ones keep
+    a worker busy. If fidelity is not None, each individual is first
+    evaluated with fewer passes, and it is trained with all the passes only if
+    the fidelity rule promotes it.
+    After each generation, the state of the algorithm is passed to the
+    checkpoint function. Passing this state to the function resumes the
+    algorithm from that generation. The offspring whose evaluation was not
+    completed are evaluated again, but if the store already has their result
+    it is used.
+
+    :param population: the initial population. It is modified in place
+    :type population: list[LdaIndividual]
+    :param toolbox: DEAP toolbox with the operators and the 'evaluate'
+        function set. The evaluate function must return the record of the
+        results like evaluate
+    :type toolbox: base.Toolbox
+    :param store: the store of the fitness of the individuals
+    :type store: FitnessStore
+    :param pool: the pool of workers
+    :type pool: Pool
+    :param processes: number of workers of the pool
+    :type processes: int
+    :param mu: number of individuals selected for each generation
+    :type mu: int
+    :param lambda_: number of offspring of each generation
+    :type lambda_: int
+    :param cxpb: probability of an offspring produced by crossover
+    :type cxpb: float
+    :param mutpb: probability of an offspring produced by mutation
+    :type mutpb: float
+    :param ngen: number of generations
+    :type ngen: int
+    :param stats: statistics computed on the population at each generation
+    :type stats: tools.Statistics or None
+    :param verbose: if True, the statistics are printed
+    :type verbose: bool
+    :param checkpoint: function called with the state of the algorithm after
+        each generation
+    :type checkpoint: Callable[[dict[str, Any]], None] or None
+    :param state: the state of the algorithm to resume. If not None, the
+        population is ignored
+    :type state: dict[str, Any] or None
+    :param fidelity: the promotion rule of the multi-fidelity evaluation. If
+        None, each individual is evaluated once, with all the passes
+    :type fidelity: SuccessiveHalving or None
+    :param record_initial: if False, the records of the initial individuals
+        already in the store are not saved again. Used to resume a run that
+        stopped before its first checkpoint
+    :type record_initial: bool
+    :return: the final population and the logbook of the generations
+    :rtype: tuple[list[LdaIndividual], tools.Logbook]
+    """
+    done = queue.Queue()
+    running = 0
+
+    def start(ind, full, **kwargs):
+        nonlocal running
+        # the first training of the multi-fidelity evaluation is always saved
+        # because it is compared only with the other first trainings
+        threshold = store.save_threshold()
+        if full and threshold is not None:
+            kwargs['save_above'] = threshold
+        # the callbacks are run in a thread of the pool
+        pool.apply_async(toolbox.evaluate, (ind,), kwargs,
+                         callback=lambda r: done.put((ind, full, r, None)),
+                         error_callback=lambda e: done.put((ind, full, None,
+                                                            e)))
+        running += 1
+
+    def submit(ind, record=True):
+        if store.dispatch(ind, record):
+            if fidelity is None:
+                start(ind, True)
+            else:
+                start(ind, False, passes=fidelity.low_passes)
+
+    def record(gen, nevals):
+        record = stats.compile(population) if stats else {}
+        logbook.record(gen=gen, nevals=nevals, **record)
+        if verbose:
+            print(logbook.stream)
+
+    def save_state():
+        if checkpoint is not None:
+            checkpoint({'gen': gen, 'population': population,
+                        'finished': finished,
+                        'unfinished': list(unfinished.values()),
+                        'created': created, 'logbook': logbook,
+                        'random': random.getstate(), 'fidelity': fidelity})
+
+    # offspring created but without fitness, by id
+    unfinished = {}
+    if state is None:
+        logbook = tools.Logbook()
+        logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+        # the initial individuals are alive until the first generation, so
+        # their ids identify them when their fitness is set
+        initial_ids = {id(ind) for ind in population}
+        finished = []
+        created = 0
+        gen = 0
+        for ind in population:
+            submit(ind, record=record_initial)
+    else:
+        population[:] = state['population']
+        logbook = state['logbook']
+        initial_ids = set()
+        finished = state['finished']
+        created = state['created']
+        gen = state['gen']
+        random.setstate(state['random'])
+        if fidelity is not None and state.get('fidelity') is not None:
+            fidelity = state['fidelity']
+        for ind in state['unfinished']:
+            unfinished[id(ind)] = ind
+            # the records of the individuals completed after the checkpoint
+            # are already saved
+            submit(ind, record=False)
+            if ind.fitness.valid:
+                del unfinished[id(ind)]
+                finished.append(ind)
+
+    min_parents = min(2, len(population))
+    while True:
+        started = gen > 0 or all(ind.fitness.valid for ind in population)
+        if gen == 0 and started and not logbook:
+            record(0, len(population))
+            save_state()
+
+        while started and len(finished) >= lambda_:
+            population[:] = toolbox.select(population + finished[:lambda_], mu)
+            finished = finished[lambda_:]
+            gen += 1
+            record(gen, lambda_)
+            save_state()
+
+        # keep all the workers busy
+        while running < processes and created < lambda_ * ngen:
+            parents = [ind for ind in population if ind.fitness.valid]
+            if len(parents) < min_parents:
+                break
+            child = algorithms.varOr(parents, toolbox, 1, cxpb, mutpb)[0]
+            created += 1
+            # the reproduced individuals keep the fitness of their parent
+            if not child.fitness.valid:
+                submit(child)
+            if child.fitness.valid:
+                finished.append(child)
+            else:
+                unfinished[id(child)] = child
+
+        if running == 0 and (len(finished) < lambda_ or not started):
+            break
+
+        if running == 0:
+            continue
+
+        ind, full, result, error = done.get()
+        running -= 1
+        if error is not None:
+            raise error
+
+        if not full and fidelity.should_promote(result):
+            start(ind, True, u=result['uuid'])
+            continue
+
+        for i in [ind] + store.complete(ind, result):
+            if gen > 0 or id(i) not in initial_ids:
+                unfinished.pop(id(i), None)
+                finished.append(i)
+
+    return population, logbook
+
+
+def save_checkpoint(result_dir, state):
+    """
+    Saves the state of the GA in <result_dir>/CHECKPOINT_FILE
+
+    The file is replaced atomically, so an interruption never leaves a
+    partial checkpoint.
+
+    :param result_dir: path to the directory of the results
+    :type result_dir: Path
+    :param state: the state of the GA, as given by ea_steady_state
+    :type state: dict[str, Any]
+    """
+    tmp = result_dir / (CHECKPOINT_FILE + '.tmp')
+    with open(tmp, 'wb') as file:
+        pickle.dump(state, file)
+    os.replace(tmp, result_dir / CHECKPOINT_FILE)
+
+
+def load_checkpoint(result_dir):
+    """
+    Loads the state of the GA saved by save_checkpoint
+
+    :param result_dir: path to the directory of the results
+    :type result_dir: Path
+    :return: the state of the GA or None if no checkpoint was saved
+    :rtype: dict[str, Any] or None
+    """
+    try:
+        with open(result_dir / CHECKPOINT_FILE, 'rb') as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_results(result_dir):
+    """
+    Loads the records of the results of a previous run
+
+    :param result_dir: path to the directory of the results
+    :type result_dir: Path
+    :return: the records of the results or None if there are no records
+    :rtype: pd.DataFrame or None
+    """
+    try:
+        return pd.read_csv(result_dir / RESULTS_TABLE,
+                           float_precision='round_trip')
+    except FileNotFoundError:
+        return None
+
+
 def optimization(documents, titles, params, toolbox, args, model_dir):
     """
     Performs the optimization of the LDA model using the GA
@@ -583,6 +1488,7 @@ def optimization(documents, titles, params, toolbox, args, model_dir):
     :param model_dir: path to the directory where to save the models
     :type model_dir: Path
     """
+    result_dir = model_dir.parent
     pop = toolbox.population(n=params['algorithm']['initial'])
     stats = tools.Statistics(lambda ind: ind.fitness.values)
     stats.register('avg', np.mean)
@@ -590,19 +1496,42 @@ def optimization(documents, titles, params, toolbox, args, model_dir):
     stats.register('min', np.min)
     stats.register('max', np.max)
     print('Starting GA optimization')
-    with Manager() as m:
-        coherence_cache = m.dict()
-        with Pool(processes=PHYSICAL_CPUS, initializer=init_train,
-                  initargs=(documents, titles, args.seed,
-                            model_dir, coherence_cache)) as pool:
-            toolbox.register('map', pool.map)
-            algorithms.eaMuPlusLambda(pop, toolbox,
-                                      mu=params['algorithm']['mu'],
-                                      lambda_=params['algorithm']['lambda'],
-                                      cxpb=params['probabilities']['mate'],
-                                      mutpb=params['probabilities']['mutate'],
-                                      ngen=params['algorithm']['generations'],
-                                      stats=stats, verbose=True)
+    store = FitnessStore(model_dir, args.seed, len(documents),
+                         result_dir / RESULTS_TABLE, args.keep_models)
+    fidelity = None
+    if params['fidelity']['low_passes'] > 0:
+        fidelity = SuccessiveHalving(params['fidelity']['low_passes'],
+                                     params['fidelity']['promote'])
+    state = None
+    if args.resume is not None:
+        results = load_results(result_dir)
+        if results is not None:
+            store.load(results)
+        state = load_checkpoint(result_dir)
+        gen = 'start' if state is None else f'generation {state["gen"]}'
+        print(f'Resuming from {gen}, {len(store)} individuals already '
+              f'evaluated')
+        logger.info(f'Resuming {result_dir} from {gen}')
+    # the corpus is encoded once and shared read-only with all the workers
+    encoded = EncodedCorpus(documents)
+    logger.debug(f'Encoded corpus: {len(encoded.dfs)} words, '
+                 f'{len(encoded.ids)} bag-of-words entries')
+    coherence_index = CoherenceIndex(documents)
+    logger.debug(f'Coherence index: {coherence_index.cooccurrences.nnz} '
+                 f'co-occurring pairs')
+    with Pool(processes=PHYSICAL_CPUS, initializer=init_train,
+              initargs=(documents, encoded, coherence_index, titles,
+                        args.seed, model_dir)) as pool:
+        ea_steady_state(pop, toolbox, store, pool, PHYSICAL_CPUS,
+                        mu=params['algorithm']['mu'],
+                        lambda_=params['algorithm']['lambda'],
+                        cxpb=params['probabilities']['mate'],
+                        mutpb=params['probabilities']['mutate'],
+                        ngen=params['algorithm']['generations'],
+                        stats=stats, verbose=True,
+                        checkpoint=lambda st: save_checkpoint(result_dir, st),
+                        state=state, fidelity=fidelity,
+                        record_initial=args.resume is None)
 
 
 def prepare_ga_toolbox(max_no_below, params):
@@ -639,7 +1568,8 @@ def prepare_ga_toolbox(max_no_below, params):
                      indpb=params['probabilities']['component_mutation'])
     toolbox.register('select', tools.selTournament,
                      tournsize=params['algorithm']['tournament_size'])
-    toolbox.register('evaluate', evaluate)
+    toolbox.register('evaluate', evaluate,
+                     patience=params['fidelity']['patience'])
     return toolbox
 
 
@@ -652,8 +1582,16 @@ def lda_ga_optimization(args):
                                   args.target_column,
                                   args.title,
                                   args.delimiter)
+    ga_params = args.ga_params
+    if args.resume is not None:
+        if not (args.resume / 'models').is_dir():
+            msg = 'Error: {!r} is not a directory of lda_ga results'
+            sys.exit(msg.format(str(args.resume)))
+        # the run must continue with the same parameters
+        ga_params = args.resume / 'ga_params.toml'
+
     try:
-        params = load_ga_params(args.ga_params)
+        params = load_ga_params(ga_params)
     except ValueError as e:
         sys.exit(e.args[0])
 
@@ -681,10 +1619,14 @@ def lda_ga_optimization(args):
     logger.info(f'Estimated trainings: {estimated_trainings}')
 
     # prepare result directories
-    now = datetime.now()
-    result_dir = args.outdir / f'{now:%Y-%m-%d_%H%M%S}_lda_results'
-    result_dir.mkdir(exist_ok=True, parents=True)
-    shutil.copy(args.ga_params, result_dir / 'ga_params.toml')
+    if args.resume is not None:
+        result_dir = args.resume
+    else:
+        now = datetime.now()
+        result_dir = args.outdir / f'{now:%Y-%m-%d_%H%M%S}_lda_results'
+        result_dir.mkdir(exist_ok=True, parents=True)
+        shutil.copy(args.ga_params, result_dir / 'ga_params.toml')
+
     model_dir = result_dir / 'models'
     model_dir.mkdir(exist_ok=True)
 
@@ -692,7 +1634,10 @@ def lda_ga_optimization(args):
         optimization(docs, titles, params, toolbox, args, model_dir)
     except KeyboardInterrupt:
         pass
-    df = collect_results(model_dir)
+    if not (result_dir / RESULTS_TABLE).is_file():
+        sys.exit('No individual evaluated')
+
+    df = collect_results(result_dir / RESULTS_TABLE, model_dir)
 
     best = df.at[0, 'uuid']
     lda_path = model_dir / best
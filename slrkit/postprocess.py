@@ -8,20 +8,26 @@ if not sys.warnoptions:
     warnings.simplefilter('ignore')
 
 import logging
-from itertools import repeat
 from multiprocessing import Pool
 from pathlib import Path
+from timeit import default_timer as timer
+from typing import Optional
+
 from psutil import cpu_count
 
 import pandas as pd
 
 from slrkit_utils.argument_parser import ArgParse
-from utils import STOPWORD_PLACEHOLDER, assert_column
-from preprocess import tuple_to_nested_dict
+from aho_corasick import AhoCorasick
+from utils import (STOPWORD_PLACEHOLDER, assert_column, chunked,
+                   log_pool_times, pool_chunksize)
 
 
 PHYSICAL_CPUS = cpu_count(logical=False)
 
+# arguments of filter_doc after the text, used by the multiprocess workers
+_filter_args: Optional[tuple] = None
+
 
 # TODO: old stuff to clean up
 def to_ignore(_):
@@ -108,53 +114,72 @@ def is_relevant(word, relevant_prefix):
     return None
 
 
-def matching_term(term_as_list, terms_dict_lookup):
-    """Checks if there is any match between the term and the list of terms."""
-    curr_dict = terms_dict_lookup
-    matched_words = []
-    for w in term_as_list:
-        if w in curr_dict:
-            matched_words.append(w)
-            curr_dict = curr_dict[w]
-        else:
-            break
-    if len(matched_words) == len(term_as_list):
-        return matched_words
-    return None
+def build_terms_matcher(terms, placeholder):
+    """
+    Builds the matcher used to search the terms in the documents
 
+    The terms containing the placeholder as a word are never accepted, so they
+    are not added to the matcher.
 
-def filter_doc(text: str, ngram_len, terms, placeholder, relevant_prefix):
-    accepted_words = []
-    text_list = text.split(' ')
-    # generates a lookup structure to perform a quicker replacement
-    terms_dict_lookup = {}
+    :param terms: the terms to search, grouped by number of words
+    :type terms: dict[int, set[str]]
+    :param placeholder: the placeholder for the stop-words
+    :type placeholder: str
+    :return: the matcher of the terms
+    :rtype: AhoCorasick
+    """
+    matcher = AhoCorasick()
     for n in terms:
-        rel_words_list = {tuple(w.split(' ')) for w in terms[n]}
-        terms_dict_lookup[n] = tuple_to_nested_dict(rel_words_list)
-    for i in range(len(text_list)):
+        for t in terms[n]:
+            words = t.split(' ')
+            if placeholder not in words:
+                matcher.add(words)
+
+    matcher.build()
+    return matcher
+
+
+def filter_doc(text: str, terms_matcher, relevant_prefix):
+    """
+    Filters a document keeping only the relevant words and the terms
+
+    The terms are searched with terms_matcher built by build_terms_matcher.
+    A relevant word (a word surrounded by relevant_prefix) is kept without the
+    prefix and no term starting from it is searched. The terms are returned
+    ordered by start position and, for the same start, from the longest to
+    the shortest, with their words separated by '_'.
+
+    :param text: the text of the document
+    :type text: str
+    :param terms_matcher: matcher of the terms
+    :type terms_matcher: AhoCorasick
+    :param relevant_prefix: prefix used to mark the relevant words
+    :type relevant_prefix: str
+    :return: the words and terms kept
+    :rtype: list[str]
+    """
+    text_list = text.split(' ')
+    found = {}
+    for start, length, _ in terms_matcher.matches(text_list):
+        found.setdefault(start, []).append(length)
+
+    accepted_words = []
+    for i, word in enumerate(text_list):
         # check if it is a "special" word
-        rel = is_relevant(text_list[i], relevant_prefix)
+        rel = is_relevant(word, relevant_prefix)
         if rel is not None:
             accepted_words.append(rel)
             continue
-        # generates the n-grams starting from the current word
-        for n in ngram_len:
-            if i <= len(text_list) - n:
-                ngram = text_list[i:i + n]
-            else:
-                continue
-            # skip all n-grams containing a placeholder for stopwords
-            if placeholder in ngram:
-                continue
-            # accept if the n-gram matches one of the terms
-            mt = matching_term(ngram, terms_dict_lookup[n])
-            if mt is not None:
-                accepted_words.append('_'.join(ngram))
+
+        lengths = found.get(i)
+        if lengths is not None:
+            for n in sorted(lengths, reverse=True):
+                accepted_words.append('_'.join(text_list[i:i + n]))
+
     return accepted_words
 
 
-def linear_filtering(documents, ngram_len,
-                     terms, placeholder, relevant_prefix):
+def linear_filtering(documents, terms_matcher, relevant_prefix):
     """Filters documents sequentially.
 
     Useful for debugging purposes, since it avoids the complexity
@@ -163,25 +188,62 @@ def linear_filtering(documents, ngram_len,
     logger = logging.getLogger('debug_logger')
     docs = []
     for i, d in enumerate(documents):
-        result = filter_doc(d, ngram_len, terms, placeholder, relevant_prefix)
+        result = filter_doc(d, terms_matcher, relevant_prefix)
         docs.append(result)
         logger.debug(f'Completed document: {i}/{len(documents)}')
     return docs
 
 
-def parallel_filtering(documents, ngram_len,
-                       terms, placeholder, relevant_prefix):
+def init_filtering(filter_args):
+    """
+    Initializes a worker of parallel_filtering
+
+    The read-only data used to filter each document are received only once by
+    each worker and saved in a global.
+
+    :param filter_args: the arguments of filter_doc after the text
+    :type filter_args: tuple
+    """
+    global _filter_args
+    _filter_args = filter_args
+
+
+def filter_chunk(documents):
+    """
+    Filters a chunk of documents in a worker of parallel_filtering
+
+    :param documents: the documents to filter
+    :type documents: list[str]
+    :return: the filtered documents and the time spent filtering them
+    :rtype: tuple[list[list[str]], float]
+    """
+    start = timer()
+    docs = [filter_doc(d, *_filter_args) for d in documents]
+    return docs, timer() - start
+
+
+def parallel_filtering(documents, terms_matcher, relevant_prefix):
     """Filters documents in parallel.
 
     Default, more efficient approach.
+    The terms matcher is sent only once to each worker and the documents are
+    sent in chunks.
     """
-    with Pool(processes=PHYSICAL_CPUS) as pool:
-        docs = pool.starmap(filter_doc,
-                            zip(documents,
-                                repeat(ngram_len),
-                                repeat(terms),
-                                repeat(placeholder),
-                                repeat(relevant_prefix)))
+    logger = logging.getLogger('debug_logger')
+    filter_args = (terms_matcher, relevant_prefix)
+    chunksize = pool_chunksize(len(documents), PHYSICAL_CPUS)
+    start = timer()
+    with Pool(processes=PHYSICAL_CPUS, initializer=init_filtering,
+              initargs=(filter_args,)) as pool:
+        results = list(pool.imap(filter_chunk,
+                                 chunked(documents, chunksize)))
+
+    log_pool_times(logger, 'parallel_filtering', PHYSICAL_CPUS,
+                   timer() - start, sum(r[1] for r in results))
+    docs = []
+    for chunk, _ in results:
+        docs.extend(chunk)
+
     return docs
 
 
@@ -195,15 +257,16 @@ def filter_docs(terms_file, preproc_file,
                 relevant_prefix=STOPWORD_PLACEHOLDER):
     logger = logging.getLogger('debug_logger')
     terms = load_keywords(terms_file, labels)
-    ngram_len = sorted(terms, reverse=True)
+    # the lookup structure is built only once and shared by all the documents
+    terms_matcher = build_terms_matcher(terms, placeholder)
     docs = load_documents(preproc_file, target_col, delimiter)
     msg = f"Filtering data from '{target_col}' in {preproc_file}"
     src_docs = docs[target_col].to_list()
     logger.debug(msg)
-    # filtered_docs = linear_filtering(src_docs, ngram_len, terms,
-    #                                  placeholder, relevant_prefix)
-    filtered_docs = parallel_filtering(src_docs, ngram_len, terms,
-                                       placeholder, relevant_prefix)
+    # filtered_docs = linear_filtering(src_docs, terms_matcher,
+    #                                  relevant_prefix)
+    filtered_docs = parallel_filtering(src_docs, terms_matcher,
+                                       relevant_prefix)
     joined = []
     for elem in filtered_docs:
         joined.append(' '.join(elem))
@@ -1,12 +1,15 @@
 import abc
+import contextlib
 import copy
+import itertools
+import json
 import logging
 import re
 import sys
-from itertools import repeat
+from collections import OrderedDict
 from multiprocessing import Pool
 from timeit import default_timer as timer
-from typing import Generator, Tuple, Sequence
+from typing import Dict, Generator, Optional, Tuple, Sequence
 
 import nltk
 import pandas as pd
@@ -14,12 +17,15 @@ import pandas as pd
 from nltk.stem.wordnet import WordNetLemmatizer
 from psutil import cpu_count
 
+from aho_corasick import AhoCorasick
+from preprocess_cache import PreprocessCache, config_fingerprint
 from schwartz_hearst import extract_abbreviation_definition_pairs
 
 from slrkit_utils.argument_parser import (AppendMultipleFilesAction,
                                           AppendMultiplePairsAction,
                                           ArgParse)
 import utils
+from version import __slrkit_version__
 
 
 setup_logger = utils.setup_logger
@@ -35,22 +41,143 @@ PHYSICAL_CPUS = cpu_count(logical=False)
 barrier_string = '%%%%%'
 
 
+LEMMA_CACHE_SIZE = 200000
+
+# these globals are used by the multiprocess workers of process_corpus
+_lemmatizer: Optional['Lemmatizer'] = None
+_item_args: Optional[tuple] = None
+
+
+class LemmaCache:
+    """
+    Bounded word -> lemma cache
+
+    When the cache is full, the least recently used word is discarded.
+    The cache counts its hits and misses and keeps track of the words added
+    since the last call to take_stats, so the parent process can collect the
+    work done by each worker.
+    """
+
+    def __init__(self, maxsize=LEMMA_CACHE_SIZE, content=None):
+        """
+        :param maxsize: maximum number of words in the cache
+        :type maxsize: int
+        :param content: initial content of the cache
+        :type content: dict[str, str] or None
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._new: Dict[str, str] = {}
+        if content is not None:
+            self.update(content)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, word):
+        """
+        Returns the lemma of word or None if word is not in the cache
+
+        :param word: the word to search
+        :type word: str
+        :return: the lemma or None
+        :rtype: str or None
+        """
+        lemma = self._cache.get(word)
+        if lemma is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._cache.move_to_end(word)
+
+        return lemma
+
+    def put(self, word, lemma):
+        """
+        Adds the lemma of word to the cache
+
+        :param word: the word
+        :type word: str
+        :param lemma: the lemma of the word
+        :type lemma: str
+        """
+        self._cache[word] = lemma
+        self._cache.move_to_end(word)
+        self._new[word] = lemma
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def update(self, content):
+        """
+        Adds all the word -> lemma pairs in content without counting them as new
+
+        :param content: the pairs to add
+        :type content: dict[str, str]
+        """
+        for word, lemma in content.items():
+            self._cache[word] = lemma
+            self._cache.move_to_end(word)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def take_stats(self):
+        """
+        Returns the hits, the misses and the words added since the last call
+
+        The counters and the new words are reset.
+
+        :return: the tuple (hits, misses, new words)
+        :rtype: tuple[int, int, dict[str, str]]
+        """
+        stats = (self.hits, self.misses, self._new)
+        self.hits = 0
+        self.misses = 0
+        self._new = {}
+        return stats
+
+    def content(self):
+        """
+        Returns the content of the cache from the least to the most recently used
+
+        :return: the word -> lemma pairs
+        :rtype: dict[str, str]
+        """
+        return dict(self._cache)
+
+
 class Lemmatizer(abc.ABC):
+    cache: Optional[LemmaCache] = None
+
     @abc.abstractmethod
     def lemmatize(self, text: Sequence[str]) -> Generator[Tuple[str, str], None, None]:
         pass
 
 
 class EnglishLemmatizer(Lemmatizer):
-    def __init__(self):
+    def __init__(self, cache=None):
         self._lem = WordNetLemmatizer()
+        self.cache = cache
 
     def lemmatize(self, text: Sequence[str]) -> Generator[Tuple[str, str], None, None]:
+        if self.cache is None:
+            for word in text:
+                yield (word, self._lem.lemmatize(word))
+            return
+
         for word in text:
-            yield (word, self._lem.lemmatize(word))
+            lemma = self.cache.get(word)
+            if lemma is None:
+                lemma = self._lem.lemmatize(word)
+                self.cache.put(word, lemma)
+
+            yield (word, lemma)
 
 
 class ItalianLemmatizer(Lemmatizer):
+    # the lemmas given by TreeTagger depend on the context of each word, so
+    # this lemmatizer does not use a cache
     def __init__(self, treetagger_dir=None):
         import warnings
         try:
@@ -96,14 +223,96 @@ AVAILABLE_LEMMATIZERS = {
     'it': ItalianLemmatizer,
 }
 
+CACHED_LEMMATIZERS = {'en'}
+
+
+def get_lemmatizer(lang='en', cache=None):
+    """
+    Creates the lemmatizer for a language
 
-def get_lemmatizer(lang='en'):
+    :param lang: code of the language
+    :type lang: str
+    :param cache: word -> lemma cache used by the lemmatizer. Ignored if the
+        lemmatizer of lang does not support a cache
+    :type cache: LemmaCache or None
+    :return: the lemmatizer
+    :rtype: Lemmatizer
+    :raise ValueError: if the language is not available
+    """
     try:
-        return AVAILABLE_LEMMATIZERS[lang]()
+        lem_class = AVAILABLE_LEMMATIZERS[lang]
     except KeyError:
-        pass
+        raise ValueError(f'language {lang!r} not available') from None
+
+    if lang in CACHED_LEMMATIZERS:
+        return lem_class(cache=cache)
+
+    return lem_class()
+
+
+def init_lemmatizer(language='en', cache_content=None,
+                    cache_size=LEMMA_CACHE_SIZE):
+    """
+    Initializes the lemmatizer used by the workers of process_corpus
+
+    It is used as initializer of each worker, so the lemmatizer and its cache
+    are created once per worker instead of once per document.
+
+    :param language: code of the language to be used to lemmatize text
+    :type language: str
+    :param cache_content: initial content of the word -> lemma cache
+    :type cache_content: dict[str, str] or None
+    :param cache_size: maximum number of words in the cache
+    :type cache_size: int
+    """
+    global _lemmatizer
+    cache = None
+    if language in CACHED_LEMMATIZERS:
+        cache = LemmaCache(cache_size, cache_content)
+
+    _lemmatizer = get_lemmatizer(language, cache=cache)
+
 
-    raise ValueError(f'language {lang!r} not available')
+def load_lemma_cache(filename, language='en'):
+    """
+    Loads the content of a word -> lemma cache saved with save_lemma_cache
+
+    A missing or invalid file, or a file saved for another language, gives an
+    empty cache.
+
+    :param filename: path to the cache file
+    :type filename: str
+    :param language: code of the language of the lemmas
+    :type language: str
+    :return: the word -> lemma pairs
+    :rtype: dict[str, str]
+    """
+    try:
+        with open(filename, encoding='utf-8') as file:
+            content = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+    if not isinstance(content, dict) or content.get('language') != language:
+        return {}
+
+    return content.get('lemmas', {})
+
+
+def save_lemma_cache(filename, content, language='en'):
+    """
+    Saves the content of a word -> lemma cache
+
+    :param filename: path to the cache file
+    :type filename: str
+    :param content: the word -> lemma pairs
+    :type content: dict[str, str]
+    :param language: code of the language of the lemmas
+    :type language: str
+    """
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump({'language': language, 'lemmas': content}, file,
+                  ensure_ascii=False)
 
 
 def to_record(config):
@@ -142,10 +351,20 @@ def to_ignore(config):
     file = config['output']
     if file is None or file == '':
         raise ValueError("'output' is not specified")
-    if file == '-':
-        return []
 
-    return [str(file)]
+    files = []
+    if file != '-':
+        files.append(str(file))
+
+    lemma_cache = config.get('lemma-cache')
+    if lemma_cache is not None and lemma_cache != '':
+        files.append(str(lemma_cache))
+
+    cache = config.get('cache')
+    if cache is not None and cache != '':
+        files.append(str(cache))
+
+    return files
 
 
 def init_argparser():
@@ -202,6 +421,12 @@ def init_argparser():
                              'Default %(default)r')
     parser.add_argument('--rows', '-R', type=int, dest='input_rows',
                         help="Select maximum number of samples")
+    parser.add_argument('--chunk-rows', type=int, metavar='ROWS',
+                        dest='chunk_rows',
+                        help='if set, the datafile is read, processed and '
+                             'written in chunks of ROWS rows, so the memory '
+                             'used does not depend on the size of the '
+                             'datafile. The output does not change.')
     parser.add_argument('--language', '-l', default='en',
                         help='language of text. Must be a ISO 639-1 two-letter '
                              'code. Default: %(default)r')
@@ -209,6 +434,20 @@ def init_argparser():
                         help='log file name. If omitted %(default)r is used',
                         logfile=True)
     parser.add_argument('--regex', help='Regex .csv for specific substitutions')
+    parser.add_argument('--lemma-cache', metavar='FILENAME',
+                        help='file used to save the lemmas computed during '
+                             'the elaboration. The saved lemmas are loaded by '
+                             'the next runs, so the already known words are '
+                             'not lemmatized again. Used only with the '
+                             'english language.')
+    parser.add_argument('--cache', metavar='FILENAME',
+                        default='preprocess_cache.db',
+                        help='file used to cache the processed documents. '
+                             'Only the documents not found in the cache are '
+                             'processed. Default: %(default)r')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='if set, the cache of the processed documents '
+                             'is not used')
     return parser
 
 
@@ -235,42 +474,9 @@ def load_stopwords(input_file):
     return stop_words_list
 
 
-def replace_ngram(text, n_grams):
-    """
-    Replace the given n-grams with a placeholder in the specified text
-
-    The n-grams and their placeholder are taken from the generator n_grams, that
-    must be a generator that yields a tuple (placeholder, n-gram). Each n-gram
-    must be a tuple of strings.
-
-    :param text: the text to search
-    :type text: list[str]
-    :param n_grams: generator that yields n-grams and their placeholder
-    :type n_grams: Generator[tuple[str, tuple[str]], Any, None]
-    :return: the transformed text
-    :rtype: list[str]
-    """
-    text2 = list(text)
-    for placeholder, ngram in n_grams:
-        end = False
-        index = -1
-        length = len(ngram)
-        while not end:
-            try:
-                # index + 1 to skip the previous match
-                index = text2.index(ngram[0], index + 1)
-                if tuple(text2[index:index + length]) == ngram:
-                    # found!
-                    text2[index:index + length] = [placeholder]
-            except ValueError:
-                end = True
-
-    return text2
-
-
 def acronyms_generator(acronyms, prefix_suffix=STOPWORD_PLACEHOLDER):
     """
-    Generator that yields acronyms and the relative placeholder for replace_ngram
+    Generator that yields acronyms and the relative placeholder
 
     The acronyms Dataframe must have the following format:
     * a column 'acronym' with the extended acronym;
@@ -296,6 +502,194 @@ def acronyms_generator(acronyms, prefix_suffix=STOPWORD_PLACEHOLDER):
         yield sub, alt
 
 
+def build_acronyms_matcher(acronyms, prefix_suffix=STOPWORD_PLACEHOLDER):
+    """
+    Builds the matcher used to replace the extended acronyms
+
+    Each pattern of the matcher is an extended acronym, as yielded by
+    acronyms_generator, and its value is the placeholder to use as replacement.
+    If two acronyms have the same extended form, the first one is used.
+
+    :param acronyms: the acronyms to replace in each document. Must have two
+        columns 'acronym' and 'abbrev'. See acronyms_generator for the format.
+    :type acronyms: pd.DataFrame
+    :param prefix_suffix: prefix and suffix used to create the placeholder
+    :type prefix_suffix: str
+    :return: the matcher, ready to be used
+    :rtype: AhoCorasick
+    """
+    matcher = AhoCorasick()
+    for sub, ngram in acronyms_generator(acronyms, prefix_suffix):
+        matcher.add(ngram, sub)
+
+    matcher.build()
+    return matcher
+
+
+def build_relevant_matcher(relevant_terms):
+    """
+    Builds the matcher used to mark the relevant terms
+
+    All the terms from all the sets of relevant_terms are put in the same
+    matcher, so each document is searched only once.
+
+    :param relevant_terms: the relevant terms to search. Each n-gram must be a
+        tuple of strings
+    :type relevant_terms: list[tuple[set[tuple[str]], str or None]]
+    :return: the matcher, ready to be used
+    :rtype: AhoCorasick
+    """
+    matcher = AhoCorasick()
+    for rel_set, _ in relevant_terms:
+        for rel in rel_set:
+            matcher.add(rel)
+
+    matcher.build()
+    return matcher
+
+
+# regex used by language_specific_regex, compiled once for each language
+# The first step in every language is to change punctuations to the stop-word
+# placeholder. The stop-word placeholder can be anything, so we have to change
+# the punctuation with something that will survive the special char removal.
+# barrier_string it's ok because hyphens are preserved in every language.
+LANGUAGE_REGEX = {
+    'en': [
+        # punctuation
+        # remove commas
+        (re.compile(','), ' '),
+        # other punctuation is considered as a barrier
+        (re.compile('[.;:!?()"\']'), ' ' + barrier_string + ' '),
+        # Remove special characters (not the hyphen) and digits
+        # also preserve the '__' used by some placeholders
+        (re.compile(r'([^-\w])+|(?<=[^_])_(?=[^_])'), ' '),
+    ],
+    'it': [
+        # punctuation
+        # remove commas
+        (re.compile(','), ' '),
+        # preserve "'" but other punctuation is considered as a barrier
+        (re.compile('[,.;:!?()"]'), ' ' + barrier_string + ' '),
+        # Remove special characters (not the hyphen) and digits. but preserve
+        # accented letters. Also preserve "'" if surrounded by non blank chars
+        # and the '__' used by some placeholders
+        (re.compile(r'(\d|[^-\wàèéìòù_\']'
+                    r'|(?<=\s)\'(?=\S)|(?<=\S)\'(?!\S))+'
+                    r'|(?<=[^_])_(?=[^_])'), ' '),
+    ],
+}
+BARRIER_REGEX = re.compile(barrier_string)
+# any run of hyphens not surrounded by non space
+HYPHENS_REGEX = re.compile(r'(\s+-+\s+|(?<=\S)-+\s+|\s+-+(?=\S))|(-{2,})')
+WHITESPACE_REGEX = re.compile(r'\s')
+
+
+class RegexPlan:
+    """
+    Compiled form of the project specific regex
+
+    The plan is built once from the dataframe loaded from the regex file, and
+    then it is applied to each document with the apply method.
+    The dataframe must have the columns 'pattern', 'repl' and 'regexBoolean'.
+    Each pattern found is replaced with '__<repl>__'. The rows are divided in
+    three groups:
+    * the rows with regexBoolean False are not actually regex. Their patterns
+      are merged in a single alternation and replaced in one pass. If two of
+      these patterns overlap, the longest one wins;
+    * the regex that contain the sequence '\\s' are applied to the whole
+      text;
+    * all the other regex are applied to each word of the text. All these
+      regex are applied word by word in a single pass over the text.
+    All the regex are case insensitive.
+    """
+
+    def __init__(self, regex_df=None):
+        """
+        :param regex_df: dataframe with the regex to apply. If None, the plan
+            does nothing
+        :type regex_df: pd.DataFrame or None
+        """
+        self._literal = None
+        self._literal_repl = {}
+        self._text_regex = []
+        self._word_regex = []
+        if regex_df is None:
+            return
+
+        # Some of the regex are not actually regex. Like <br>
+        not_regex = regex_df[~regex_df['regexBoolean']]
+        for pattern, repl in zip(not_regex['pattern'], not_regex['repl']):
+            if pattern != '':
+                self._literal_repl.setdefault(pattern, '__{}__'.format(repl))
+
+        if self._literal_repl:
+            literals = sorted(self._literal_repl, key=len, reverse=True)
+            self._literal = re.compile('|'.join(re.escape(lit)
+                                                for lit in literals))
+
+        regex_df = regex_df[~regex_df['pattern'].isin(not_regex['pattern'])]
+        regex_with_spaces = regex_df[regex_df['pattern'].str.contains(r'\s',
+                                                                      regex=False)]
+        for pattern, repl in zip(regex_with_spaces['pattern'],
+                                 regex_with_spaces['repl']):
+            self._text_regex.append((re.compile(pattern, flags=re.IGNORECASE),
+                                     '__{}__'.format(repl)))
+
+        rows = regex_df[~regex_df['pattern'].isin(regex_with_spaces['pattern'])]
+        for pattern, repl in zip(rows['pattern'], rows['repl']):
+            self._word_regex.append((re.compile(pattern, flags=re.IGNORECASE),
+                                     '__{}__'.format(repl)))
+
+    def _replace_literal(self, match):
+        return self._literal_repl[match.group(0)]
+
+    def _apply_word(self, word, start=0):
+        """
+        Applies the word regex to a word, starting from the start-th regex
+
+        If a substitution introduces some spaces, each resulting word is
+        elaborated separately by the following regex. Empty words are dropped,
+        unless they are produced by the last regex.
+
+        :param word: the word to elaborate
+        :type word: str
+        :param start: index of the first regex to apply
+        :type start: int
+        :return: the list of resulting words
+        :rtype: list[str]
+        """
+        last = len(self._word_regex) - 1
+        for i in range(start, last + 1):
+            pattern, repl = self._word_regex[i]
+            word, n = pattern.subn(repl, word)
+            if n and i < last and (word == '' or WHITESPACE_REGEX.search(word)):
+                return [w for piece in word.split()
+                        for w in self._apply_word(piece, i + 1)]
+
+        return [word]
+
+    def apply(self, text):
+        """
+        Applies the plan to a text
+
+        :param text: text to elaborate
+        :type text: str
+        :return: the elaborated text
+        :rtype: str
+        """
+        if self._literal is not None:
+            text = self._literal.sub(self._replace_literal, text)
+
+        for pattern, repl in self._text_regex:
+            text = pattern.sub(repl, text)
+
+        if self._word_regex:
+            text = ' '.join([w for word in text.split()
+                             for w in self._apply_word(word)])
+
+        return text
+
+
 def language_specific_regex(text, lang='en'):
     """
     Applies some regex specific for a language
@@ -311,40 +705,18 @@ def language_specific_regex(text, lang='en'):
     :return: the elaborated text
     :rtype: str
     """
-    # The first step in every language is to change punctuations to the stop-word
-    # placeholder. The stop-word placeholder can be anything, so we have to change
-    # the punctuation with something that will survive the special char removal.
-    # barrier_string it's ok because hyphens are preserved in every language.
-    if lang == 'en':
-        # punctuation
-        # remove commas
-        out_text = re.sub(',', ' ', text)
-        # other punctuation is considered as a barrier
-        out_text = re.sub('[.;:!?()"\']', ' ' + barrier_string + ' ', out_text)
-        # Remove special characters (not the hyphen) and digits
-        # also preserve the '__' used by some placeholders
-        return re.sub(r'([^-\w])+|(?<=[^_])_(?=[^_])', ' ', out_text)
-    if lang == 'it':
-        # punctuation
-        # remove commas
-        out_text = re.sub(',', ' ', text)
-        # preserve "'" but other punctuation is considered as a barrier
-        out_text = re.sub('[,.;:!?()"]', ' ' + barrier_string + ' ', out_text)
-        # Remove special characters (not the hyphen) and digits. but preserve
-        # accented letters. Also preserve "'" if surrounded by non blank chars
-        # and the '__' used by some placeholders
-        return re.sub(r'(\d|[^-\wàèéìòù_\']'
-                      r'|(?<=\s)\'(?=\S)|(?<=\S)\'(?!\S))+'
-                      r'|(?<=[^_])_(?=[^_])',
-                      ' ', out_text)
+    for pattern, repl in LANGUAGE_REGEX[lang]:
+        text = pattern.sub(repl, text)
+
+    return text
 
 
 def regex(text, stopword_placeholder=STOPWORD_PLACEHOLDER, lang='en',
-          regex_df=None):
+          regex_plan=None):
     """
     Applies some regex to a text
 
-    This function applies the regex defined in the regex_df.
+    This function applies the regex compiled in the regex_plan.
     It also applies the language specific regex and some standard regex and it
     changes the barrier_string with the barrier.
     :param text: text to elaborate
@@ -354,43 +726,25 @@ def regex(text, stopword_placeholder=STOPWORD_PLACEHOLDER, lang='en',
     :type stopword_placeholder: str
     :param lang: code of the language (e.g. 'en' for english)
     :type lang: str
-    :param regex_df: dataframe with the regex to apply
-    :type regex_df: pd.DataFrame
+    :param regex_plan: compiled regex to apply
+    :type regex_plan: RegexPlan or None
     :return: the elaborated text
     :rtype: str
     """
-    # If a regex DataFrame for the specific project is passed,
+    # If a regex plan for the specific project is passed,
     # this function will replace the patterns with the corresponding repl
     # parameter
-    if regex_df is not None:
-        # Some of the regex are not actually regex. Like <br>
-        not_regex = regex_df[~regex_df['regexBoolean']]
-        for _, row in not_regex.iterrows():
-            text = text.replace(row['pattern'], '__{}__'.format(row['repl']))
-
-        regex_df = regex_df[~regex_df['pattern'].isin(not_regex['pattern'])]
-        regex_with_spaces = regex_df[regex_df['pattern'].str.contains(r'\s',
-                                                                      regex=False)]
-
-        for _, row in regex_with_spaces.iterrows():
-            text = re.sub(row['pattern'], '__{}__'.format(row['repl']), text,
-                          flags=re.IGNORECASE)
-
-        rows = regex_df[~regex_df['pattern'].isin(regex_with_spaces['pattern'])]
-        for _, row in rows.iterrows():
-            text = ' '.join([re.sub(row['pattern'],
-                                    '__{}__'.format(row['repl']), gram,
-                                    flags=re.IGNORECASE)
-                             for gram in text.split()])
+    if regex_plan is not None:
+        text = regex_plan.apply(text)
     # Change punctuation and remove special characters (not the hyphen) and
     # digits. The definition of special character and punctuation, changes with
     # the language
     text = language_specific_regex(text, lang)
     # now we can search for ' barrier_string ' and place the stop-word placeholder
     # the positive look-ahead and look-behind are to preserve the spaces
-    text = re.sub(barrier_string, stopword_placeholder, text)
+    text = BARRIER_REGEX.sub(stopword_placeholder, text)
     # remove any run of hyphens not surrounded by non space
-    text = re.sub(r'(\s+-+\s+|(?<=\S)-+\s+|\s+-+(?=\S))|(-{2,})', ' ', text)
+    text = HYPHENS_REGEX.sub(' ', text)
 
     return text
 
@@ -413,49 +767,51 @@ def is_number(s):
         return False
 
 
-def preprocess_item(item, relevant_terms, stopwords, acronyms, language='en',
-                    placeholder=STOPWORD_PLACEHOLDER,
-                    relevant_prefix=RELEVANT_PREFIX, regex_df=None, acro_dict=None):
+def preprocess_item(item, relevant_matcher, stopwords, acronyms_matcher,
+                    language='en', placeholder=STOPWORD_PLACEHOLDER,
+                    relevant_prefix=RELEVANT_PREFIX, regex_plan=None,
+                    acro_dict=None):
     """
     Preprocess the text of a document.
 
-    It lemmatizes the text. Then it searches for the relevant terms. The
-    relevant_terms argument is a list of tuples. Each tuple contains a set of
-    relevant terms to search for, and a placeholder. If the placeholder is None,
-    each relevant term found is replaced with a string composed with the
-    relevant_prefix, then all the words composing the term separated
-    with '_' and finally the relevant_prefix. If the placeholder is not None,
-    then each term associated with that prefix is replaced with a string
-    composed by the relevant_prefix, the placeholder and then the
-    relevant_prefix.
-    The function then searches for the acronyms, changing the words composing
-    them with the corresponding abbreviation.
+    It lemmatizes the text. Then it searches for the relevant terms using the
+    relevant_matcher built with build_relevant_matcher. Each relevant term
+    found is replaced with a string composed with the relevant_prefix, then all
+    the words composing the term separated with '_' and finally the
+    relevant_prefix. When two terms overlap, the longest term starting first
+    is used.
+    The function then searches for the acronyms, using the acronyms_matcher
+    built with build_acronyms_matcher, changing the words composing them with
+    the corresponding abbreviation.
     It also filters the stop-words changing them with the stopword_placeholder
     string as placeholder.
 
     :param item: the text to process
     :type item: str
-    :param relevant_terms: the relevant words to search. Each n-gram must be a
-        tuple of strings
-    :type relevant_terms: list[tuple[set[tuple[str]], str or None]]
+    :param relevant_matcher: matcher of the relevant terms to search
+    :type relevant_matcher: AhoCorasick
     :param stopwords: the stop-words to filter
     :type stopwords: set[str]
-    :param acronyms: the acronyms to replace in each document. Must have two
-        columns 'term' and 'label'. See the acronyms_generato documentation for
-        info about the format.
-    :type acronyms: pd.DataFrame
+    :param acronyms_matcher: matcher of the acronyms to replace
+    :type acronyms_matcher: AhoCorasick
     :param language: code of the language to be used to lemmatize text
     :type language: str
     :param placeholder: placeholder for the stop-words
     :type placeholder: str
     :param relevant_prefix: prefix string used when replacing the relevant terms
     :type relevant_prefix: str
-    :param regex_df: dataframe with the regex to apply
-    :type regex_df: pd.DataFrame
+    :param regex_plan: compiled regex to apply
+    :type regex_plan: RegexPlan or None
+    :param acro_dict: association between the acronyms abbreviations and their
+        index in the acronyms dataframe
+    :type acro_dict: dict[str, int]
     :return: the processed text
-    :rtype: list[str]
+    :rtype: str
     """
-    lem = get_lemmatizer(language)
+    if _lemmatizer is not None:
+        lem = _lemmatizer
+    else:
+        lem = get_lemmatizer(language)
     # replace acronym abbreviation - it's done here because we need to search
     # the abbreviation in case sensitive mode. To mark the barrier, we use
     # barrier_string as placeholder because is preserved and substituted with
@@ -474,11 +830,11 @@ def preprocess_item(item, relevant_terms, stopwords, acronyms, language='en',
         text = re.sub(rf'@{pl[1]}@', f"{barrier_string}{pl[0]}{barrier_string}", text)
 
     # apply some regex to clean the text
-    text = regex(text, placeholder, language, regex_df=regex_df)
+    text = regex(text, placeholder, language, regex_plan=regex_plan)
     text = text.split(' ')
 
     # replace extended acronyms
-    text = replace_ngram(text, acronyms_generator(acronyms, relevant_prefix))
+    text = acronyms_matcher.replace(text, lambda _, sub: sub)
 
     # remove numbers
     text1 = [w for w in text if not is_number(w)]
@@ -486,16 +842,8 @@ def preprocess_item(item, relevant_terms, stopwords, acronyms, language='en',
     text2 = [lem_word for _, lem_word in lem.lemmatize(text1)]
 
     # mark relevant terms
-    if len(relevant_terms) > 0:
-        i = 0
-        while i < len(text2):
-            n, replacement_string = find_replacement(text2[i:], relevant_terms, relevant_prefix)
-            if n > 0:
-                text3 = text2[:i]
-                text3.append(replacement_string)
-                text3.extend(text2[i+n:])
-                text2 = text3
-            i += 1
+    text2 = relevant_matcher.replace(
+        text2, lambda rel, _: f'{relevant_prefix}{"_".join(rel)}{relevant_prefix}')
 
     if len(stopwords) != 0:
         for i, word in enumerate(text2):
@@ -506,32 +854,205 @@ def preprocess_item(item, relevant_terms, stopwords, acronyms, language='en',
     return text2
 
 
-def find_replacement(text, replacements, relevant_prefix):
-    maxreplen = 0
-    replacement_string = f'{relevant_prefix}{relevant_prefix}'
-    for rep_dict, ph in replacements:
-        dict_to_check = rep_dict
-        count = 0
-        while text[count] in dict_to_check:
-            dict_to_check = dict_to_check[text[count]]
-            count += 1
-            if count > maxreplen:
-                if count > 0 and None in dict_to_check:
-                    replacement_string = f'{relevant_prefix}{"_".join(text[:count])}{relevant_prefix}'
-                    maxreplen = count
-            if count >= len(text):
-                break
-    return maxreplen, replacement_string
+def init_worker(item_args, language='en', cache_content=None,
+                cache_size=LEMMA_CACHE_SIZE):
+    """
+    Initializes a worker of process_corpus
+
+    The read-only data used to process each document are received only once
+    by each worker and saved in a global, together with the lemmatizer.
+
+    :param item_args: the arguments of preprocess_item after the text of the
+        document
+    :type item_args: tuple
+    :param language: code of the language to be used to lemmatize text
+    :type language: str
+    :param cache_content: initial content of the word -> lemma cache
+    :type cache_content: dict[str, str] or None
+    :param cache_size: maximum number of words in the cache
+    :type cache_size: int
+    """
+    global _item_args
+    _item_args = item_args
+    init_lemmatizer(language, cache_content, cache_size)
+
+
+def preprocess_chunk(items):
+    """
+    Preprocess a chunk of documents in a worker of process_corpus
+
+    :param items: the texts of the documents
+    :type items: list[str]
+    :return: the processed texts, the statistics of the lemma cache of the
+        worker, as returned by LemmaCache.take_stats, or None if the lemmatizer
+        does not use a cache, and the time spent processing the chunk
+    :rtype: tuple[list[str], tuple[int, int, dict[str, str]] or None, float]
+    """
+    start = timer()
+    texts = [preprocess_item(item, *_item_args) for item in items]
+    stats = None
+    if _lemmatizer.cache is not None:
+        stats = _lemmatizer.cache.take_stats()
+
+    return texts, stats, timer() - start
+
+
+class CorpusProcessor:
+    """
+    Processes the documents of a corpus, one chunk of documents at a time
+
+    The matchers for the relevant terms and for the acronyms and the regex plan
+    are built only once, when the processor is created. If the processing is
+    parallel, a single pool of workers is used for all the chunks. The
+    read-only data are sent only once to each worker, and the documents are
+    sent to the workers in chunks. The lemmatizer is created once in each
+    worker. The pool is started only when the first document is processed.
+    If lemma_cache is given, its content is used to initialize the lemma cache
+    of each worker, and the lemmas computed by the workers are added to it.
+    Its hits and misses are updated with the ones of all the workers.
+    If doc_cache is given, the documents found in it are not processed again,
+    and the processed documents are added to it.
+
+    The processor must be used as a context manager.
+    """
+
+    def __init__(self, relevant_terms, stopwords, acronyms, language='en',
+                 placeholder=STOPWORD_PLACEHOLDER,
+                 relevant_prefix=RELEVANT_PREFIX, regex_df=None,
+                 parallel=True, lemma_cache=None, doc_cache=None):
+        """
+        :param relevant_terms: the related terms to search in each document
+        :type relevant_terms: list[tuple[set[tuple[str]], str]]
+        :param stopwords: the stop-words to filter in each document
+        :type stopwords: set[str]
+        :param acronyms: the acronyms to replace in each document. Must have
+            two columns 'term' and 'label'. See the acronyms_generato
+            documentation for info about the format.
+        :type acronyms: pd.Dataframe
+        :param language: code of the language to be used to lemmatize text
+        :type language: str
+        :param placeholder: placeholder for the stop-words
+        :type placeholder: str
+        :param relevant_prefix: prefix used to replace the relevant terms
+        :type relevant_prefix: str
+        :param regex_df: dataframe with the regex to apply
+        :type regex_df: pd.DataFrame or None
+        :param parallel: if True the documents are processed in parallel
+        :type parallel: bool
+        :param lemma_cache: the word -> lemma cache shared between the runs
+        :type lemma_cache: LemmaCache or None
+        :param doc_cache: the cache of the processed documents
+        :type doc_cache: PreprocessCache or None
+        """
+        acro_dict = acronyms.to_dict()["abbrev"]
+        acro_dict = {v: k for k, v in acro_dict.items()}
+        relevant_matcher = build_relevant_matcher(relevant_terms)
+        acronyms_matcher = build_acronyms_matcher(acronyms, relevant_prefix)
+        regex_plan = RegexPlan(regex_df)
+        item_args = (relevant_matcher, stopwords, acronyms_matcher, language,
+                     placeholder, relevant_prefix, regex_plan, acro_dict)
+        self._init_args = (item_args, language)
+        if lemma_cache is not None:
+            self._init_args += (lemma_cache.content(), lemma_cache.maxsize)
+
+        self.parallel = parallel
+        self.lemma_cache = lemma_cache
+        self.doc_cache = doc_cache
+        self._pool = None
+        self._wall_time = 0.0
+        self._compute_time = 0.0
+
+    def __enter__(self):
+        if not self.parallel:
+            init_worker(*self._init_args)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._pool is not None:
+            if exc_type is None:
+                self._pool.close()
+            else:
+                self._pool.terminate()
+
+            self._pool.join()
+            self._pool = None
+            if exc_type is None:
+                debug_logger = logging.getLogger('debug_logger')
+                utils.log_pool_times(debug_logger, 'process_corpus',
+                                     PHYSICAL_CPUS, self._wall_time,
+                                     self._compute_time)
+
+    def process(self, dataset):
+        """
+        Process a chunk of documents
+
+        :param dataset: the documents to process
+        :type dataset: pd.Sequence
+        :return: the processed documents
+        :rtype: list[str]
+        """
+        if self.doc_cache is None:
+            return self._process_documents(dataset)
+
+        keys = [self.doc_cache.key(d) for d in dataset]
+        found = self.doc_cache.get(keys)
+        missing = {}
+        for k, d in zip(keys, dataset):
+            if k not in found:
+                missing[k] = d
+
+        processed = dict(zip(missing,
+                             self._process_documents(list(missing.values()))))
+        self.doc_cache.put(processed)
+        found.update(processed)
+        return [found[k] for k in keys]
+
+    def _process_documents(self, dataset):
+        if len(dataset) == 0:
+            return []
+
+        if self.parallel:
+            if self._pool is None:
+                # the pool is started only when there is something to process
+                self._pool = Pool(processes=PHYSICAL_CPUS,
+                                  initializer=init_worker,
+                                  initargs=self._init_args)
+
+            chunksize = utils.pool_chunksize(len(dataset), PHYSICAL_CPUS)
+            start = timer()
+            results = list(self._pool.imap(preprocess_chunk,
+                                           utils.chunked(dataset, chunksize)))
+            self._wall_time += timer() - start
+            self._compute_time += sum(r[2] for r in results)
+        else:
+            results = []
+            for i, item in enumerate(dataset):
+                print(f"Processing item {i}/{len(dataset)} | {item[:60]}...")
+                results.append(preprocess_chunk([item]))
+
+        corpus = []
+        for texts, stats, _ in results:
+            corpus.extend(texts)
+            if self.lemma_cache is not None and stats is not None:
+                hits, misses, new_lemmas = stats
+                self.lemma_cache.hits += hits
+                self.lemma_cache.misses += misses
+                self.lemma_cache.update(new_lemmas)
+
+        return corpus
 
 
 def process_corpus(dataset, relevant_terms, stopwords, acronyms, language='en',
                    placeholder=STOPWORD_PLACEHOLDER,
                    relevant_prefix=RELEVANT_PREFIX, regex_df=None,
-                   parallel=True):
+                   parallel=True, lemma_cache=None):
     """
     Process a corpus of documents.
 
-    Each documents is processed using the preprocess_item function
+    Each documents is processed using the preprocess_item function.
+    The whole corpus is processed as a single chunk by a CorpusProcessor. See
+    its documentation for the meaning of the arguments.
 
     :param dataset: the corpus of documents
     :type dataset: pd.Sequence
@@ -551,31 +1072,17 @@ def process_corpus(dataset, relevant_terms, stopwords, acronyms, language='en',
     :type relevant_prefix: str
     :param regex_df: dataframe with the regex to apply
     :type regex_df: pd.DataFrame or None
+    :param parallel: if True the documents are processed in parallel
+    :type parallel: bool
+    :param lemma_cache: the word -> lemma cache shared between the runs
+    :type lemma_cache: LemmaCache or None
     :return: the corpus processed
     :rtype: list[str]
     """
-
-    acro_dict = acronyms.to_dict()["abbrev"]
-    acro_dict = {v: k for k, v in acro_dict.items()}
-    if parallel:
-        with Pool(processes=PHYSICAL_CPUS) as pool:
-            corpus = pool.starmap(preprocess_item, zip(dataset,
-                                                       repeat(relevant_terms),
-                                                       repeat(stopwords),
-                                                       repeat(acronyms),
-                                                       repeat(language),
-                                                       repeat(placeholder),
-                                                       repeat(relevant_prefix),
-                                                       repeat(regex_df),
-                                                       repeat(acro_dict)))
-    else:
-        corpus = []
-        for i, item in enumerate(dataset):
-            print(f"Processing item {i}/{len(dataset)} | {item[:60]}...")
-            new_text = preprocess_item(item, relevant_terms, stopwords, acronyms, language, placeholder, relevant_prefix, regex_df, acro_dict)
-            corpus.append(new_text)
-
-    return corpus
+    with CorpusProcessor(relevant_terms, stopwords, acronyms, language,
+                         placeholder, relevant_prefix, regex_df, parallel,
+                         lemma_cache) as processor:
+        return processor.process(dataset)
 
 
 def tuple_to_nested_dict(rel_words_list):
@@ -626,9 +1133,7 @@ def load_relevant_terms(input_file):
                       for w in rel_words_list
                       if w != '' and w[0] != '#'}
 
-    words = tuple_to_nested_dict(rel_words_list)
-
-    return words
+    return rel_words_list
 
 
 def prepare_acronyms(acronym):
@@ -692,6 +1197,125 @@ def load_acronyms(file):
     return acronyms
 
 
+def preprocess_fingerprint(relevant_terms, stopwords, acronyms, language,
+                           placeholder, relevant_prefix, regex_df):
+    """
+    Computes the fingerprint of the configuration of the preprocess
+
+    The fingerprint changes if anything that affects the result of the
+    preprocess of a document is changed.
+
+    :param relevant_terms: the related terms to search in each document
+    :type relevant_terms: list[tuple[set[tuple[str]], str]]
+    :param stopwords: the stop-words to filter in each document
+    :type stopwords: set[str]
+    :param acronyms: the acronyms to replace in each document
+    :type acronyms: pd.Dataframe
+    :param language: code of the language to be used to lemmatize text
+    :type language: str
+    :param placeholder: placeholder for the stop-words
+    :type placeholder: str
+    :param relevant_prefix: prefix used to replace the relevant terms
+    :type relevant_prefix: str
+    :param regex_df: dataframe with the regex to apply
+    :type regex_df: pd.DataFrame or None
+    :return: the fingerprint
+    :rtype: str
+    """
+    rel = [[sorted(' '.join(t) for t in terms), plh]
+           for terms, plh in relevant_terms]
+    if regex_df is not None:
+        regex_csv = regex_df.to_csv()
+    else:
+        regex_csv = None
+
+    return config_fingerprint(version=__slrkit_version__,
+                              nltk=nltk.__version__,
+                              relevant_terms=rel,
+                              stopwords=sorted(stopwords),
+                              acronyms=acronyms.to_csv(),
+                              language=language,
+                              placeholder=placeholder,
+                              relevant_prefix=relevant_prefix,
+                              regex=regex_csv)
+
+
+def prepare_dataset(dataset, datafile, target_column):
+    """
+    Prepares a dataset, or a chunk of it, to be processed
+
+    The missing values are replaced with ''. If the 'status' column is present,
+    only the rows with status 'good' are kept and the column is removed.
+
+    :param dataset: the dataset
+    :type dataset: pd.DataFrame
+    :param datafile: name of the file of the dataset
+    :type datafile: str
+    :param target_column: name of the column to process
+    :type target_column: str
+    :return: the prepared dataset
+    :rtype: pd.DataFrame
+    """
+    dataset.fillna('', inplace=True)
+    assert_column(datafile, dataset, target_column)
+    # filter the paper using the information from the filter_paper script
+    try:
+        dataset = dataset[dataset['status'] == 'good'].copy()
+    except KeyError:
+        # no column 'status', so no filtering
+        pass
+    else:
+        dataset.drop(columns='status', inplace=True)
+        dataset.reset_index(drop=True, inplace=True)
+
+    return dataset
+
+
+def read_dataset_chunks(datafile, delimiter, chunk_rows, nrows=None):
+    """
+    Generator that reads a dataset in chunks of rows
+
+    The file is read twice. The first pass computes the type of each column
+    of the whole file, then these types are imposed to each chunk. This way,
+    each value is formatted as if the whole file was read at once, e.g. an
+    integer column with some missing values is always read as float, and a
+    text column keeps its raw text even in a chunk where it looks numeric.
+    Only one chunk of the file is in memory at any time.
+
+    :param datafile: name of the file to read
+    :type datafile: str
+    :param delimiter: delimiter used in the file
+    :type delimiter: str
+    :param chunk_rows: number of rows of each chunk
+    :type chunk_rows: int
+    :param nrows: maximum number of rows to read
+    :type nrows: int or None
+    :return: a generator that yields the chunks
+    :rtype: Generator[pd.DataFrame, Any, None]
+    """
+    col_kinds = {}
+    with pd.read_csv(datafile, delimiter=delimiter, encoding='utf-8',
+                     nrows=nrows, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            for col, dtype in chunk.dtypes.items():
+                col_kinds.setdefault(col, set()).add(dtype.kind)
+
+    dtypes = {}
+    for col, kinds in col_kinds.items():
+        if 'O' in kinds:
+            # text in the whole file: the missing values are still NaN
+            dtypes[col] = str
+        elif kinds == {'i'}:
+            dtypes[col] = 'int64'
+        elif kinds <= {'i', 'f'}:
+            dtypes[col] = 'float64'
+
+    with pd.read_csv(datafile, delimiter=delimiter, encoding='utf-8',
+                     nrows=nrows, chunksize=chunk_rows,
+                     dtype=dtypes) as reader:
+        yield from reader
+
+
 def preprocess(args):
     # download wordnet
     try:
@@ -714,28 +1338,6 @@ def preprocess(args):
     name = 'preprocess'
     log_start(args, debug_logger, name)
 
-    # load the dataset
-    try:
-        dataset = pd.read_csv(args.datafile, delimiter=args.input_delimiter,
-                              encoding='utf-8', nrows=args.input_rows)
-    except FileNotFoundError as err:
-        msg = 'Error: file {!r} not found'
-        sys.exit(msg.format(err.filename))
-
-    dataset.fillna('', inplace=True)
-    assert_column(args.datafile, dataset, target_column)
-    # filter the paper using the information from the filter_paper script
-    try:
-        dataset = dataset[dataset['status'] == 'good'].copy()
-    except KeyError:
-        # no column 'status', so no filtering
-        pass
-    else:
-        dataset.drop(columns='status', inplace=True)
-        dataset.reset_index(drop=True, inplace=True)
-
-    debug_logger.debug('Dataset loaded {} items'.format(len(dataset[target_column])))
-
     # csvFileName da CLI
     if args.regex is not None:
         try:
@@ -772,16 +1374,36 @@ def preprocess(args):
 
         debug_logger.debug('Relevant words loaded and updated')
 
-    start = timer()
-    corpus = process_corpus(dataset[target_column], rel_terms, stopwords,
-                            acronyms, language=args.language,
-                            placeholder=placeholder,
-                            relevant_prefix=relevant_prefix, regex_df=regex_df,
-                            parallel=args.no_parallel)
-    stop = timer()
-    elapsed_time = stop - start
-    debug_logger.debug('Corpus processed')
-    dataset[args.output_column] = corpus
+    lemma_cache = None
+    if args.language in CACHED_LEMMATIZERS:
+        content = None
+        if args.lemma_cache is not None:
+            content = load_lemma_cache(args.lemma_cache, args.language)
+            debug_logger.debug(f'Lemma cache loaded {len(content)} words')
+
+        lemma_cache = LemmaCache(content=content)
+
+    # load the dataset
+    try:
+        if args.chunk_rows is None:
+            chunks = [pd.read_csv(args.datafile,
+                                  delimiter=args.input_delimiter,
+                                  encoding='utf-8', nrows=args.input_rows)]
+        else:
+            chunks = read_dataset_chunks(args.datafile, args.input_delimiter,
+                                         args.chunk_rows, args.input_rows)
+            # starts reading the file to detect a missing file
+            first = next(chunks, None)
+            if first is None:
+                # no rows to read: the output has only the header, as in the
+                # non chunked mode
+                first = pd.read_csv(args.datafile,
+                                    delimiter=args.input_delimiter,
+                                    encoding='utf-8', nrows=0)
+            chunks = itertools.chain([first], chunks)
+    except FileNotFoundError as err:
+        msg = 'Error: file {!r} not found'
+        sys.exit(msg.format(err.filename))
 
     # write to output, either a file or stdout (default)
     if args.output == '-':
@@ -789,8 +1411,57 @@ def preprocess(args):
     else:
         output_file = open(args.output, 'w', encoding='utf-8')
 
-    dataset.to_csv(output_file, index=None, header=True,
-                   sep=args.output_delimiter)
+    num_items = 0
+    elapsed_time = 0.0
+    header = True
+    with contextlib.ExitStack() as stack:
+        doc_cache = None
+        if not args.no_cache:
+            fingerprint = preprocess_fingerprint(rel_terms, stopwords, acronyms,
+                                                 args.language, placeholder,
+                                                 relevant_prefix, regex_df)
+            doc_cache = stack.enter_context(PreprocessCache(args.cache,
+                                                            fingerprint))
+
+        processor = stack.enter_context(
+            CorpusProcessor(rel_terms, stopwords, acronyms,
+                            language=args.language, placeholder=placeholder,
+                            relevant_prefix=relevant_prefix,
+                            regex_df=regex_df, parallel=args.no_parallel,
+                            lemma_cache=lemma_cache, doc_cache=doc_cache))
+        for dataset in chunks:
+            dataset = prepare_dataset(dataset, args.datafile, target_column)
+            num_items += len(dataset)
+            start = timer()
+            corpus = processor.process(dataset[target_column])
+            elapsed_time += timer() - start
+            dataset[args.output_column] = corpus
+            dataset.to_csv(output_file, index=None, header=header,
+                           sep=args.output_delimiter)
+            header = False
+
+    debug_logger.debug(f'Dataset loaded {num_items} items')
+    debug_logger.debug('Corpus processed')
+    if doc_cache is not None:
+        debug_logger.debug(f'Document cache: {doc_cache.hits} documents '
+                           f'found, {doc_cache.misses} documents processed')
+    if lemma_cache is not None:
+        lookups = lemma_cache.hits + lemma_cache.misses
+        if lookups != 0:
+            hit_rate = lemma_cache.hits / lookups
+        else:
+            hit_rate = 0.0
+        debug_logger.debug(f'Lemma cache: {lemma_cache.hits} hits, '
+                           f'{lemma_cache.misses} misses, hit rate '
+                           f'{hit_rate:.2%}, {len(lemma_cache)} words')
+        if args.lemma_cache is not None:
+            save_lemma_cache(args.lemma_cache, lemma_cache.content(),
+                             args.language)
+            debug_logger.debug('Lemma cache saved')
+
+    if output_file is not sys.stdout:
+        output_file.close()
+
     print('Elapsed time:', elapsed_time, file=sys.stderr)
     debug_logger.info(f'elapsed time: {elapsed_time}')
     log_end(debug_logger, name)
@@ -0,0 +1,159 @@
+"""
+Cache of the documents elaborated by the preprocess script.
+
+Each processed document is saved in a sqlite database, with a key computed
+from the text of the document and from the fingerprint of the configuration
+used to process it. When the preprocess is run again, only the documents not
+found in the cache are elaborated.
+The cache keeps at most a fixed number of documents: when this number is
+exceeded, the least recently used documents are removed. The documents used in
+the current run are never removed.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+
+CACHE_MAX_DOCS = 200000
+
+# maximum number of parameters used in a single sqlite query
+_QUERY_BATCH = 500
+
+
+def config_fingerprint(**config):
+    """
+    Computes the fingerprint of a configuration
+
+    Each value of config must be serializable with json, with the sets
+    converted to sorted lists.
+
+    :param config: the configuration values
+    :type config: Any
+    :return: the fingerprint
+    :rtype: str
+    """
+    data = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class PreprocessCache:
+    """
+    Cache of the processed documents, saved in a sqlite database
+
+    The cache must be used as a context manager. The documents used during the
+    run are marked as recently used, and the eviction is done when the context
+    is exited.
+    """
+
+    def __init__(self, filename, fingerprint, max_docs=CACHE_MAX_DOCS):
+        """
+        :param filename: path to the database file
+        :type filename: str
+        :param fingerprint: fingerprint of the configuration used to process
+            the documents
+        :type fingerprint: str
+        :param max_docs: maximum number of documents kept in the cache
+        :type max_docs: int
+        """
+        self.filename = filename
+        self.fingerprint = fingerprint
+        self.max_docs = max_docs
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._run_start = 0.0
+
+    def __enter__(self):
+        self._conn = sqlite3.connect(self.filename)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS docs ('
+                           'key TEXT PRIMARY KEY, '
+                           'text TEXT NOT NULL, '
+                           'last_used REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS docs_last_used '
+                           'ON docs (last_used)')
+        self._conn.commit()
+        self._run_start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.evict()
+
+        self._conn.close()
+        self._conn = None
+
+    def key(self, document):
+        """
+        Computes the key of a document
+
+        :param document: the text of the document
+        :type document: str
+        :return: the key
+        :rtype: str
+        """
+        h = hashlib.sha256(self.fingerprint.encode('utf-8'))
+        h.update(b'\0')
+        h.update(document.encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, keys):
+        """
+        Searches the documents with the given keys
+
+        The documents found are marked as used.
+
+        :param keys: the keys of the documents
+        :type keys: list[str]
+        :return: the processed documents found, by key
+        :rtype: dict[str, str]
+        """
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), _QUERY_BATCH):
+            batch = unique[i:i + _QUERY_BATCH]
+            marks = ', '.join('?' * len(batch))
+            cur = self._conn.execute(f'SELECT key, text FROM docs '
+                                     f'WHERE key IN ({marks})', batch)
+            found.update(cur.fetchall())
+
+        now = time.time()
+        self._conn.executemany('UPDATE docs SET last_used = ? WHERE key = ?',
+                               ((now, k) for k in found))
+        self._conn.commit()
+        for k in keys:
+            if k in found:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return found
+
+    def put(self, items):
+        """
+        Adds some processed documents to the cache
+
+        :param items: the processed documents, by key
+        :type items: dict[str, str]
+        """
+        now = time.time()
+        self._conn.executemany('INSERT OR REPLACE INTO docs '
+                               '(key, text, last_used) VALUES (?, ?, ?)',
+                               ((k, t, now) for k, t in items.items()))
+        self._conn.commit()
+
+    def evict(self):
+        """
+        Removes the least recently used documents if the cache is too big
+
+        The documents used in the current run are never removed.
+        """
+        count = self._conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+        excess = count - self.max_docs
+        if excess <= 0:
+            return
+
+        self._conn.execute('DELETE FROM docs WHERE key IN ('
+                           'SELECT key FROM docs WHERE last_used < ? '
+                           'ORDER BY last_used LIMIT ?)',
+                           (self._run_start, excess))
+        self._conn.commit()
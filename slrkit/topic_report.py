@@ -1,5 +1,6 @@
 import collections
 import datetime
+import hashlib
 import json
 import math
 import os
@@ -8,10 +9,14 @@ import shutil
 import pandas as pd
 import sys
 from itertools import islice
+from multiprocessing import Pool
 
 from jinja2 import Environment, FileSystemLoader
-from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from psutil import cpu_count
 from tabulate import tabulate
+from docs_topics import DocsTopics, docs_topics_paths, load_docs_topics
 from utils import assert_column
 
 from slrkit_utils.argument_parser import ArgParse
@@ -33,6 +38,14 @@ JOURNALTOPIC_CSV = 'journaltopic.csv'
 JOURNALYEAR_CSV = 'journalyear.csv'
 YEARTOPIC_CSV = 'yeartopic.csv'
 PLACEHOLDERFIGURE = 'placeholder.png'
+REPORT_CACHE_DIRNAME = '.report_cache'
+BUILD_MANIFEST = 'manifest.json'
+STATISTICS = 'statistics'
+PHYSICAL_CPUS = cpu_count(logical=False)
+
+
+def to_ignore(_):
+    return [f'{REPORT_CACHE_DIRNAME}/']
 
 
 def init_argparser():
@@ -69,6 +82,10 @@ def init_argparser():
                         help='create compact table for topics')
     parser.add_argument('--no_stats', '-s', action='store_true',
                         help='do not list terms stats in topics terms table')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Number of processes used to draw the figures. '
+                             'If 0, all the physical cores are used. '
+                             'Default %(default)r')
 
     return parser
 
@@ -80,7 +97,8 @@ def prepare_papers(abstract_path, json_path):
 
     :param abstract_path: path to the abstracts file containing papers data
     :type abstract_path: str
-    :param json_path: path to json file containing lda results
+    :param json_path: path to json file containing lda results. If the binary
+        matrix saved with it exists, the matrix is used
     :type json_path: str
     :return: the list of dictionaries and the list of topics
     :rtype: tuple[list, list]
@@ -89,10 +107,8 @@ def prepare_papers(abstract_path, json_path):
         message ready to be shown to the user
     """
 
-    with open(json_path) as file:
-        papers_with_topics = json.load(file)
-
-    if not isinstance(papers_with_topics, list):
+    papers_with_topics = load_docs_topics(json_path)
+    if not isinstance(papers_with_topics, (list, DocsTopics)):
         msg = 'Error: wrong format in file {!r}: the main object is not a list'
         raise ValueError(msg.format(str(json_path)))
 
@@ -108,7 +124,9 @@ def prepare_papers(abstract_path, json_path):
 
     papers_dict = abstract_df.to_dict('records')
 
-    for paper in papers_dict:
+    if isinstance(papers_with_topics, DocsTopics):
+        titles = papers_with_topics.titles
+    else:
         for i, paper_data in enumerate(papers_with_topics):
             if not isinstance(paper_data, dict):
                 msg = 'Error: wrong format in file {!r}: the {} object is not a dict'
@@ -119,31 +137,60 @@ def prepare_papers(abstract_path, json_path):
                           'the {} object has not the {} key'
                     raise ValueError(msg.format(str(json_path), i, k))
 
-            if paper['title'] == paper_data['title']:
-                topics = paper_data['topics']
-                paper['topics'] = topics
-                good_papers.append(paper)
-                break
+        titles = [paper_data['title'] for paper_data in papers_with_topics]
 
-    topics_list = []
+    # each paper is matched with the first document with the same title
+    index = {}
+    for i, title in enumerate(titles):
+        index.setdefault(title, i)
 
+    for paper in papers_dict:
+        i = index.get(paper['title'])
+        if i is None:
+            continue
+        if isinstance(papers_with_topics, DocsTopics):
+            # only the topics of the papers found are read from the matrix
+            paper['topics'] = papers_with_topics.topics(i)
+        else:
+            paper['topics'] = papers_with_topics[i]['topics']
+        good_papers.append(paper)
+
+    topics_list = set()
     for paper in good_papers:
-        for key in paper['topics']:
-            if key not in topics_list:
-                topics_list.append(key)
+        topics_list.update(paper['topics'])
 
-    topics_list.sort()
+    topics_list = sorted(topics_list)
 
     return good_papers, topics_list
 
 
-def report_year(papers_list, topics_list):
+def papers_topics_frame(papers_list):
     """
-    Creates a dictionary with number of papers published each year for every topic.
-    Papers are weighted by coherence.
+    Creates the long-format table of the papers and their topics.
+
+    The table has a row for each topic of each paper, and a row with no topic
+    for each paper without topics. The columns are 'paper' (the index of the
+    paper in papers_list), 'journal', 'year', 'topic' and 'probability'.
 
     :param papers_list: list of dictionaries with data for every paper
     :type papers_list: list
+    :return: the table of the papers and their topics
+    :rtype: pd.DataFrame
+    """
+    rows = [(i, paper['journal'], paper['year'], topic, float(prob))
+            for i, paper in enumerate(papers_list)
+            for topic, prob in (paper['topics'].items() or [(None, math.nan)])]
+    return pd.DataFrame(rows, columns=['paper', 'journal', 'year', 'topic',
+                                       'probability'])
+
+
+def report_year(papers, topics_list):
+    """
+    Creates a dictionary with number of papers published each year for every topic.
+    Papers are weighted by coherence.
+
+    :param papers: table of the papers and their topics
+    :type papers: pd.DataFrame
     :param topics_list: list of topics
     :type topics_list: list
     :return: dictionary with topic-year data
@@ -151,79 +198,69 @@ def report_year(papers_list, topics_list):
     """
 
     topics_dict = {t: {} for t in topics_list}
-
-    for topic_id in topics_list:
-        for paper in papers_list:
-            topics = paper['topics']
-            if str(topic_id) in topics:
-                year = int(paper['year'])
-                topics_dict[topic_id][year] = (topics_dict[topic_id].get(year, 0)
-                                               + float(topics[str(topic_id)]))
+    papers = papers[papers['topic'].isin(topics_list)]
+    years = papers['year'].astype(int)
+    sums = papers.groupby(['topic', years])['probability'].sum()
+    for (topic, year), value in sums.items():
+        topics_dict[topic][int(year)] = value
 
     return topics_dict
 
 
-def prepare_journals(papers_list):
+def prepare_journals(papers):
     """
     Check how many papers were published by each journal.
 
-    :param papers_list: list with data of every paper
-    :type papers_list: list
+    :param papers: table of the papers and their topics
+    :type papers: pd.DataFrame
     :return: list of journals and their number of publications
     :rtype: list
     """
 
-    journals = []
-    journals_dict = {}
-    for paper in papers_list:
-        journal_name = paper['journal']
-        if journal_name not in journals:
-            journals.append(journal_name)
-
-    for journal in journals:
-        for paper in papers_list:
-            journal_name = paper['journal']
-            if journal_name == journal:
-                journals_dict[journal] = journals_dict.get(journal, 0) + 1
-
-    journals_dict = sorted(journals_dict.items(), key=lambda x: x[1],
-                           reverse=True)
+    papers = papers.drop_duplicates('paper')
+    counts = papers.groupby('journal', sort=False).size()
+    # stable sort: journals with the same count keep their order of appearance
+    counts = counts.sort_values(ascending=False, kind='stable')
+    journals_dict = list(zip(counts.index.tolist(), counts.tolist()))
 
     return journals_dict
 
 
-def report_journal_topics(journals_dict, papers_list):
+def report_journal_topics(journals_dict, papers):
     """
     Creates a dictionary with for each journal the number of papers published for
     each topic.
 
     :param journals_dict: list of dictionary with data of journals and their publications
     :type journals_dict: list
-    :param papers_list: list with data of every paper
-    :type papers_list: list
+    :param papers: table of the papers and their topics
+    :type papers: pd.DataFrame
     :return: dictionary with journal-topic data
     :rtype: dict
     """
 
+    journals = [journal for journal, _ in journals_dict[0:10]]
+    papers = papers[papers['journal'].isin(journals) & papers['topic'].notna()]
     journal_topic = collections.defaultdict(dict)
-    for journal, _ in journals_dict[0:10]:
-        for paper in papers_list:
-            journal_title = paper['journal']
-            if journal_title == journal:
-                topics = paper['topics']
-                for topic in topics:
-                    journal_topic[journal][topic] = (journal_topic[journal].get(topic, 0) + topics[topic])
+    if len(papers) == 0:
+        return journal_topic
+
+    table = papers.pivot_table(index='journal', columns='topic',
+                               values='probability', aggfunc='sum')
+    for journal in journals:
+        if journal in table.index:
+            journal_topic[journal] = table.loc[journal].dropna().to_dict()
 
     return journal_topic
 
 
-def report_journal_years(papers_list, journals_dict):
+def report_journal_years(papers, journals_dict):
     """
     Creates a dictionary with for each journal the number of papers published for
     each year.
 
-    :param papers_list: list with data of every paper
-    :type papers_list: list
+    :param papers: table of the papers and their topics
+    :type papers: pd.DataFrame
     :param journals_dict: list of dictionary with data of journals and their publications
     :type journals_dict: list
     :return: dictionary with journal-year data and the min and max year in the dict
@@ -232,24 +269,236 @@ def report_journal_years(papers_list, journals_dict):
     journal_year = collections.defaultdict(dict)
     min_year = float('inf')
     max_year = -1
-    for journal, value in journals_dict[0:10]:
-        for paper in papers_list:
-            journal_title = paper['journal']
-            if journal_title == journal:
-                year = int(paper['year'])
-                journal_year[journal][year] = journal_year[journal].get(year, 0) + 1
-                if year > max_year:
-                    max_year = year
-                if year < min_year:
-                    min_year = year
+    journals = [journal for journal, _ in journals_dict[0:10]]
+    papers = papers.drop_duplicates('paper')
+    papers = papers[papers['journal'].isin(journals)]
+    if len(papers) == 0:
+        return journal_year, min_year, max_year
+
+    years = papers['year'].astype(int)
+    table = papers.groupby(['journal', years]).size().unstack(fill_value=0)
+    for journal in journals:
+        if journal in table.index:
+            row = table.loc[journal]
+            journal_year[journal] = {int(y): int(n) for y, n in row.items()
+                                     if n > 0}
+    min_year = int(years.min())
+    max_year = int(years.max())
 
     return journal_year, min_year, max_year
 
 
-def plot_years(topics_dict, dirname, plot_size, templates):
+def files_digest(*paths):
+    """
+    Computes the hash of the content of some files
+
+    :param paths: the files to hash
+    :type paths: str or pathlib.Path
+    :return: the hex digest of the hash
+    :rtype: str
+    :raise FileNotFoundError: if one of the files is missing
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+
+    return digest.hexdigest()
+
+
+class ReportBuild:
+    """
+    Artifacts of the previous report, saved in the cache of the project
+
+    Each artifact has a name and is built from some inputs. It is made of
+    some files of the report directory and, optionally, of some data.
+    The manifest of the cache records the hashes of the inputs, the files and
+    the data of each artifact, and the cache directory contains a copy of the
+    files. An artifact whose inputs did not change since the previous report
+    is copied from the cache instead of being built again. After save, the
+    cache contains only the artifacts of the current report.
+    """
+
+    def __init__(self, cache_dir, outdir):
+        """
+        :param cache_dir: directory with the artifacts of the previous report
+        :type cache_dir: pathlib.Path
+        :param outdir: directory of the current report
+        :type outdir: pathlib.Path
+        """
+        self.cache_dir = cache_dir
+        self.outdir = outdir
+        try:
+            with open(cache_dir / BUILD_MANIFEST) as file:
+                self._previous = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._previous = {}
+
+        self._manifest = {}
+        self.built = []
+        self.reused = []
+
+    def is_fresh(self, name, inputs):
+        """
+        Tells if an artifact of the previous report can be reused
+
+        :param name: name of the artifact
+        :type name: str
+        :param inputs: hashes and values of the inputs of the artifact
+        :type inputs: dict[str, Any]
+        :return: True if the artifact has the same inputs and its files are
+            in the cache
+        :rtype: bool
+        """
+        entry = self._previous.get(name)
+        if entry is None or entry['inputs'] != inputs:
+            return False
+
+        return all((self.cache_dir / f).is_file() for f in entry['files'])
+
+    def reuse(self, name):
+        """
+        Copies the files of an artifact of the previous report
+
+        :param name: name of the artifact. It must be fresh
+        :type name: str
+        :return: the data of the artifact
+        :rtype: Any
+        """
+        entry = self._previous[name]
+        for f in entry['files']:
+            (self.outdir / f).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(self.cache_dir / f, self.outdir / f)
+
+        self._manifest[name] = entry
+        self.reused.append(name)
+        return entry['data']
+
+    def add(self, name, inputs, files=(), data=None):
+        """
+        Records an artifact built by the current report
+
+        The files are copied from the report directory to the cache.
+
+        :param name: name of the artifact
+        :type name: str
+        :param inputs: hashes and values of the inputs of the artifact
+        :type inputs: dict[str, Any]
+        :param files: paths of the files of the artifact, relative to the
+            report directory
+        :type files: Sequence[str]
+        :param data: data of the artifact. It must be serializable in json
+        :type data: Any
+        """
+        for f in files:
+            (self.cache_dir / f).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(self.outdir / f, self.cache_dir / f)
+
+        self._manifest[name] = {'inputs': inputs, 'files': list(files),
+                                'data': data}
+        self.built.append(name)
+
+    def save(self):
+        """
+        Saves the manifest of the current report
+
+        The files of the cache not used by the current report are removed.
+        """
+        self.cache_dir.mkdir(exist_ok=True)
+        with open(self.cache_dir / BUILD_MANIFEST, 'w') as file:
+            json.dump(self._manifest, file)
+
+        used = {pathlib.Path(f) for entry in self._manifest.values()
+                for f in entry['files']}
+        used.add(pathlib.Path(BUILD_MANIFEST))
+        for path in self.cache_dir.rglob('*'):
+            if path.is_file() and path.relative_to(self.cache_dir) not in used:
+                path.unlink()
+
+
+def plot_topics(ax, part, part_num, parts_count):
+    """
+    Plots the yearly trend of a group of topics
+
+    :param ax: the axes where the topics are plotted
+    :type ax: matplotlib.axes.Axes
+    :param part: the name, the years and the values of each topic
+    :type part: list[tuple[str, list[str], list[float]]]
+    :param part_num: number of the group of topics, starting from 1
+    :type part_num: int
+    :param parts_count: total number of groups of topics
+    :type parts_count: int
+    """
+    for topic, x, y in part:
+        ax.plot(x, y, label=f'topic {topic}')
+    ax.grid(True)
+    ax.set_title(f'Topics yearly trend (part {part_num}/{parts_count})')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('# of papers (weighted by coherence)')
+    ax.legend()
+    for label in ax.get_xticklabels():
+        label.set(rotation=30, horizontalalignment='right', fontsize='x-small')
+
+
+def draw_year_figure(parts, first_part, parts_count, figsize, path):
+    """
+    Draws a figure with the yearly trend of some groups of topics
+
+    The figure is drawn with the Agg backend, without using pyplot, so many
+    figures can be drawn at the same time by different processes.
+    Each group is drawn in its own subplot.
+
+    :param parts: the groups of topics to draw. See plot_topics
+    :type parts: list[list[tuple[str, list[str], list[float]]]]
+    :param first_part: number of the first group, starting from 1
+    :type first_part: int
+    :param parts_count: total number of groups of topics
+    :type parts_count: int
+    :param figsize: width and height of the figure in inches. If None, the
+        default size is used
+    :type figsize: list[float] or None
+    :param path: path of the png file where the figure is saved
+    :type path: pathlib.Path
+    """
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(nrows=len(parts), ncols=1, squeeze=False)[:, 0]
+    for i, (ax, part) in enumerate(zip(axes, parts)):
+        plot_topics(ax, part, first_part + i, parts_count)
+
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def figure_key(parts, first_part, parts_count, figsize):
+    """
+    Computes the hash of the data of a figure drawn by draw_year_figure
+
+    :param parts: the groups of topics to draw
+    :type parts: list[list[tuple[str, list[str], list[float]]]]
+    :param first_part: number of the first group, starting from 1
+    :type first_part: int
+    :param parts_count: total number of groups of topics
+    :type parts_count: int
+    :param figsize: width and height of the figure in inches, or None
+    :type figsize: list[float] or None
+    :return: the hex digest of the hash
+    :rtype: str
+    """
+    data = json.dumps([parts, first_part, parts_count, figsize])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def plot_years(topics_dict, dirname, plot_size, templates, build, workers=1):
     """
     Creates a plot for the number of papers published each year for each topic
 
+    A figure is saved for each group of plot_size topics, and all the groups
+    are saved in YEARFIGURE. Each figure is an artifact of the build, with the
+    hash of its data as input, so only the figures whose data changed since
+    the previous report are drawn.
+
     :param topics_dict: dictionary with topic-year data
     :type topics_dict: dict
     :param dirname: name of the directory where graph will be saved
@@ -257,51 +506,51 @@ def plot_years(topics_dict, dirname, plot_size, templates):
     :param plot_size: number of topics per plot
     :type plot_size: int
     :param templates: name of directory where templates are saved
-    :type templates: Pat
+    :type templates: Path
+    :param build: the artifacts of the previous report
+    :type build: ReportBuild
+    :param workers: number of processes used to draw the figures
+    :type workers: int
     """
-    shutil.copy(templates / PLACEHOLDERFIGURE, dirname / YEARFIGURE)
-
     if len(topics_dict) == 0:
+        shutil.copy(templates / PLACEHOLDERFIGURE, dirname / YEARFIGURE)
         sys.stderr.write('No topics were found.\n')
         return
 
     rows = math.ceil(len(topics_dict) / plot_size)
+    parts = []
     for i in range(rows):
-        for topic in islice(topics_dict, i*plot_size, (i+1)*plot_size):
-            sorted_dic = sorted(topics_dict[topic].items())
-            x, y = zip(*sorted_dic)
-            x = [str(val) for val in x]
-            plt.plot(x, y, label=f'topic {topic}')
-            plt.title(f'Topics yearly trend (part {i + 1}/{rows})')
-            plt.xlabel('Year')
-            plt.ylabel('# of papers (weighted by coherence)')
-            plt.grid(True)
-            plt.legend()
-            plt.setp(plt.gca().get_xticklabels(), rotation=30, horizontalalignment='right', fontsize='x-small')
-            plt.tight_layout()
-            plt.savefig(dirname / f'reportyear{i + 1}')
-
-        plt.clf()
-
-    fig, ax = plt.subplots(nrows=rows, ncols=1, figsize=(8, 4*rows))
-    if rows == 1:
-        ax = [ax]
-    for i in range(rows):
+        part = []
         for topic in islice(topics_dict, i * plot_size, (i + 1) * plot_size):
-            sorted_dic = sorted(topics_dict[topic].items())
-            x, y = zip(*sorted_dic)
-            x = [str(val) for val in x]
-            ax[i].plot(x, y, label=f'topic {topic}')
-            ax[i].grid(True)
-            ax[i].set_title(f'Topics yearly trend (part {i + 1}/{rows})')
-            ax[i].set_xlabel('Year')
-            ax[i].set_ylabel('# of papers (weighted by coherence)')
-            ax[i].legend()
-            plt.setp(ax[i].get_xticklabels(), rotation=30, horizontalalignment='right', fontsize='x-small')
+            x, y = zip(*sorted(topics_dict[topic].items()))
+            part.append((topic, [str(val) for val in x], list(y)))
+        parts.append(part)
+
+    figures = [([part], i + 1, None, f'reportyear{i + 1}.png')
+               for i, part in enumerate(parts)]
+    figures.append((parts, 1, [8, 4 * rows], YEARFIGURE))
+
+    to_draw = []
+    drawn = []
+    for figure_parts, first_part, figsize, name in figures:
+        key = figure_key(figure_parts, first_part, rows, figsize)
+        inputs = {'figure': key}
+        if build.is_fresh(name, inputs):
+            build.reuse(name)
+        else:
+            to_draw.append((figure_parts, first_part, rows, figsize,
+                            dirname / name))
+            drawn.append((name, inputs))
+
+    if workers > 1 and len(to_draw) > 1:
+        with Pool(processes=min(workers, len(to_draw))) as pool:
+            pool.starmap(draw_year_figure, to_draw)
+    else:
+        for args in to_draw:
+            draw_year_figure(*args)
 
-    fig.tight_layout()
-    plt.savefig(dirname / YEARFIGURE)
-    plt.clf()
+    for name, inputs in drawn:
+        build.add(name, inputs, [name])
 
 
 def create_topic_year_list(topics_dict, max_year, min_year):
@@ -440,55 +689,104 @@ def save_latex_table(data_list, filename, fix_align, longtable):
         f.write(latex_table)
 
 
-def prepare_tables(topics_dict, journals_topic, journals_year, topic_terms_list, dirname,
-                   md_template_path, min_year, max_year):
+def prepare_statistics(abstract_path, docs_topics_path, min_year, max_year):
     """
-    Creates tables for every data created in previous function, with the Tabulate
-    module and saves them
+    Computes the statistics of the report
 
-    :param topics_dict: dictionary with topic-year data
-    :type topics_dict: dict
-    :param journals_topic: dictionary with journal-topic data
-    :type journals_topic: dict
-    :param journals_year: dictionary with journal-year data
-    :type journals_year: dict
-    :param topic_terms_list: List with topics and terms
-    :type topic_terms_list: list
-    :param dirname: name of the directory where the files will be saved
-    :type dirname: pathlib.Path
-    :param md_template_path: path to the directory containing the markdown
-        template
-    :type md_template_path: pathlib.Path
-    :param min_year: minimum year that will be used in the report
-    :type min_year: int
-    :param max_year: maximum year that will be used in the report
-    :type max_year: int
+    :param abstract_path: path to the abstracts file containing papers data
+    :type abstract_path: str
+    :param docs_topics_path: path to json file containing lda results
+    :type docs_topics_path: str
+    :param min_year: minimum year that will be used in the report. If None,
+        the minimum year in the data is used
+    :type min_year: int or None
+    :param max_year: maximum year that will be used in the report. If None,
+        the maximum year in the data is used
+    :type max_year: int or None
+    :return: the topic-year data, as a list of topics with their sorted
+        (year, value) pairs, and the topic-year, journal-topic and
+        journal-year tables
+    :rtype: dict[str, list]
+    :raise ValueError: if the minimum year is greater than the maximum year
     """
-    tables: pathlib.Path = dirname / TABLES_DIRNAME
-    tables.mkdir(exist_ok=True)
-    csv_dir: pathlib.Path = dirname / CSV_DIRNAME
-    csv_dir.mkdir(exist_ok=True)
+    papers_list, topics_list = prepare_papers(abstract_path, docs_topics_path)
+    papers = papers_topics_frame(papers_list)
+    topics_dict = report_year(papers, topics_list)
 
-    save_latex_table(topic_terms_list, tables / TOPICTERMS_TEX, False, True)
+    blank_topics = []
+    for k in topics_dict:
+        if len(topics_dict[k]) == 0:
+            sys.stderr.write('topic {} has no papers associated\n'.format(k))
+            blank_topics.append(k)
+    for k in blank_topics:
+        topics_dict.pop(k)
 
-    topic_year_list = create_topic_year_list(topics_dict, max_year, min_year)
-    save_latex_table(topic_year_list, tables / YEARTOPIC_TEX, False, False)
-    df = pd.DataFrame(topic_year_list[1:], columns=topic_year_list[0])
-    df.to_csv(csv_dir / YEARTOPIC_CSV, sep='\t', index=False)
+    journals_dict = prepare_journals(papers)
+    journals_year, data_min_year, data_max_year = report_journal_years(
+        papers, journals_dict)
+    journals_topics = report_journal_topics(journals_dict, papers)
 
-    journal_topic_list = create_journal_topic_list(journals_topic, topics_dict)
-    save_latex_table(journal_topic_list, tables / JOURNALTOPIC_TEX, True, False)
-    df = pd.DataFrame(journal_topic_list[1:], columns=journal_topic_list[0])
-    df.to_csv(csv_dir / JOURNALTOPIC_CSV, sep='\t', index=False)
+    blank_journals = []
+    for k in journals_topics:
+        if len(journals_topics[k]) == 0:
+            sys.stderr.write('journal {} has no topic associated\n'.format(k))
+            blank_journals.append(k)
+    for k in blank_journals:
+        journals_topics.pop(k)
 
-    journal_year_list = create_journal_year_list(journals_year, max_year,
-                                                 min_year)
-    save_latex_table(journal_year_list, tables / JOURNALYEAR_TEX, True, False)
-    df = pd.DataFrame(journal_year_list[1:], columns=journal_year_list[0])
-    df.to_csv(csv_dir / JOURNALYEAR_CSV, sep='\t', index=False)
+    if min_year is None:
+        min_year = data_min_year
+    if max_year is None:
+        max_year = data_max_year
 
-    save_markdown_report(topic_year_list, journal_topic_list, journal_year_list,
-                         topic_terms_list, dirname / MD_REPORT, md_template_path)
+    if min_year > max_year:
+        msg = 'The minimum year {} is greater than the maximum year {}'
+        raise ValueError(msg.format(min_year, max_year))
+
+    return {
+        'topics': [[t, sorted(topics_dict[t].items())] for t in topics_dict],
+        'topic_year': create_topic_year_list(topics_dict, max_year, min_year),
+        'journal_topic': create_journal_topic_list(journals_topics,
+                                                   topics_dict),
+        'journal_year': create_journal_year_list(journals_year, max_year,
+                                                 min_year),
+    }
+
+
+def prepare_table(data_list, name, csv_name, fix_align, longtable, dirname,
+                  build, inputs):
+    """
+    Saves a table as LaTeX file and csv file, if it is not fresh in the build
+
+    :param data_list: the table, with the header in the first row
+    :type data_list: list[list]
+    :param name: name of the LaTeX file, also used as name of the artifact
+    :type name: str
+    :param csv_name: name of the csv file. If None, the csv is not saved
+    :type csv_name: str or None
+    :param fix_align: if True, the first column of the LaTeX table is wider
+    :type fix_align: bool
+    :param longtable: if True, the LaTeX table is a longtable
+    :type longtable: bool
+    :param dirname: name of the directory where the files will be saved
+    :type dirname: pathlib.Path
+    :param build: the artifacts of the previous report
+    :type build: ReportBuild
+    :param inputs: hashes and values of the inputs of the table
+    :type inputs: dict[str, Any]
+    """
+    if build.is_fresh(name, inputs):
+        build.reuse(name)
+        return
+
+    files = [f'{TABLES_DIRNAME}/{name}']
+    save_latex_table(data_list, dirname / files[0], fix_align, longtable)
+    if csv_name is not None:
+        files.append(f'{CSV_DIRNAME}/{csv_name}')
+        df = pd.DataFrame(data_list[1:], columns=data_list[0])
+        df.to_csv(dirname / files[1], sep='\t', index=False)
+
+    build.add(name, inputs, files)
 
 
 def report(args):
@@ -504,13 +802,6 @@ def report(args):
     abstract_path = args.abstract_file
     docs_topics_path = args.docs_topics_file
     topics_path = args.terms_topics_file
-    no_stats = False
-    if args.no_stats:
-        no_stats = True
-    if args.compact:
-        topic_terms_list = compact_topic_terms(topics_path, no_stats)
-    else:
-        topic_terms_list = topic_terms_list_maker(topics_path, no_stats)
 
     if args.dir is not None:
         dirname = cwd / args.dir
@@ -519,47 +810,78 @@ def report(args):
         dirname = cwd / f'{timestamp}_report'
 
     dirname.mkdir(exist_ok=True)
+    (dirname / TABLES_DIRNAME).mkdir(exist_ok=True)
+    (dirname / CSV_DIRNAME).mkdir(exist_ok=True)
 
-    papers_list, topics_list = prepare_papers(abstract_path, docs_topics_path)
-    topics_dict = report_year(papers_list, topics_list)
-
-    blank_topics = []
-    for k in topics_dict:
-        if len(topics_dict[k]) == 0:
-            sys.stderr.write('topic {} has no papers associated\n'.format(k))
-            blank_topics.append(k)
-    for k in blank_topics:
-        topics_dict.pop(k)
-
-    plot_size = args.plotsize
-
-    plot_years(topics_dict, dirname, plot_size, templates)
-    journals_dict = prepare_journals(papers_list)
-    journals_year, min_year, max_year = report_journal_years(papers_list,
-                                                             journals_dict)
-    journals_topics = report_journal_topics(journals_dict, papers_list)
-
-    blank_journals = []
-    for k in journals_topics:
-        if len(journals_topics[k]) == 0:
-            sys.stderr.write('journal {} has no topic associated\n'.format(k))
-            blank_journals.append(k)
-    for k in blank_journals:
-        journals_topics.pop(k)
-
-    if args.minyear is not None:
-        min_year = args.minyear
-    if args.maxyear is not None:
-        max_year = args.maxyear
-
-    if min_year > max_year:
-        msg = 'The minimum year {} is greater than the maximum year {}'
-        raise ValueError(msg.format(min_year, max_year))
+    # each artifact of the report is rebuilt only if its inputs changed
+    try:
+        data_inputs = {
+            'abstract_file': files_digest(abstract_path),
+            'docs_topics_file': files_digest(
+                *docs_topics_paths(docs_topics_path)),
+            'minyear': args.minyear,
+            'maxyear': args.maxyear,
+        }
+        terms_inputs = {
+            'terms_topics_file': files_digest(topics_path),
+            'compact': args.compact,
+            'no_stats': args.no_stats,
+        }
+        md_inputs = {**data_inputs, **terms_inputs,
+                     'template': files_digest(cwd / MD_TEMPLATE)}
+        tex_inputs = {'template': files_digest(cwd / TEX_TEMPLATE)}
+    except FileNotFoundError as e:
+        msg = 'Error: file {!r} not found'
+        sys.exit(msg.format(str(e.filename)))
 
-    prepare_tables(topics_dict, journals_topics, journals_year, topic_terms_list, dirname, cwd,
-                   min_year, max_year)
+    build = ReportBuild(cwd / REPORT_CACHE_DIRNAME, dirname)
+    if build.is_fresh(STATISTICS, data_inputs):
+        statistics = build.reuse(STATISTICS)
+    else:
+        statistics = prepare_statistics(abstract_path, docs_topics_path,
+                                        args.minyear, args.maxyear)
+        build.add(STATISTICS, data_inputs, data=statistics)
+
+    topics_dict = {topic: dict(years) for topic, years in statistics['topics']}
+    workers = args.workers if args.workers > 0 else PHYSICAL_CPUS
+    plot_years(topics_dict, dirname, args.plotsize, templates, build, workers)
+
+    topic_terms_list = None
+    if (not build.is_fresh(TOPICTERMS_TEX, terms_inputs)
+            or not build.is_fresh(MD_REPORT, md_inputs)):
+        if args.compact:
+            topic_terms_list = compact_topic_terms(topics_path, args.no_stats)
+        else:
+            topic_terms_list = topic_terms_list_maker(topics_path,
+                                                      args.no_stats)
+
+    prepare_table(topic_terms_list, TOPICTERMS_TEX, None, False, True,
+                  dirname, build, terms_inputs)
+    prepare_table(statistics['topic_year'], YEARTOPIC_TEX, YEARTOPIC_CSV,
+                  False, False, dirname, build, data_inputs)
+    prepare_table(statistics['journal_topic'], JOURNALTOPIC_TEX,
+                  JOURNALTOPIC_CSV, True, False, dirname, build, data_inputs)
+    prepare_table(statistics['journal_year'], JOURNALYEAR_TEX,
+                  JOURNALYEAR_CSV, True, False, dirname, build, data_inputs)
+
+    if build.is_fresh(MD_REPORT, md_inputs):
+        build.reuse(MD_REPORT)
+    else:
+        save_markdown_report(statistics['topic_year'],
+                             statistics['journal_topic'],
+                             statistics['journal_year'], topic_terms_list,
+                             dirname / MD_REPORT, cwd)
+        build.add(MD_REPORT, md_inputs, [MD_REPORT])
+
+    if build.is_fresh(TEX_REPORT, tex_inputs):
+        build.reuse(TEX_REPORT)
+    else:
+        shutil.copy(cwd / TEX_TEMPLATE, dirname / TEX_REPORT)
+        build.add(TEX_REPORT, tex_inputs, [TEX_REPORT])
 
-    shutil.copy(cwd / TEX_TEMPLATE, dirname / TEX_REPORT)
+    build.save()
+    print('Rebuilt: {}'.format(', '.join(build.built) or 'nothing'))
+    print('Reused: {}'.format(', '.join(build.reused) or 'nothing'))
 
 
 def main():
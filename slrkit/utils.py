@@ -181,3 +181,74 @@ def log_start(args, debug_logger, name):
 
 def log_end(debug_logger, name):
     debug_logger.info(f'=== {name} ended ===')
+
+
+def pool_chunksize(num_items, num_workers, chunks_per_worker=4):
+    """
+    Computes the number of items sent to a Pool worker with each task
+
+    Each worker receives about chunks_per_worker tasks: less tasks reduce the
+    inter-process communication, more tasks balance the load between the
+    workers.
+
+    :param num_items: number of items to elaborate
+    :type num_items: int
+    :param num_workers: number of workers of the pool
+    :type num_workers: int
+    :param chunks_per_worker: number of tasks for each worker
+    :type chunks_per_worker: int
+    :return: the number of items in each task
+    :rtype: int
+    """
+    num_chunks = max(num_workers, 1) * chunks_per_worker
+    return max(1, -(-num_items // num_chunks))
+
+
+def chunked(items, size):
+    """
+    Generator that splits items in lists of size elements
+
+    The last list can have less than size elements.
+
+    :param items: the items to split
+    :type items: Iterable
+    :param size: the number of elements of each list
+    :type size: int
+    :return: a generator that yields the lists of items
+    :rtype: Generator[list, Any, None]
+    """
+    chunk = []
+    for it in items:
+        chunk.append(it)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def log_pool_times(debug_logger, name, num_workers, wall_time, compute_time):
+    """
+    Logs how the time of a multiprocess elaboration is spent
+
+    The compute time is the sum of the time spent by the workers in the actual
+    elaboration. The rest of the time available to the workers
+    (wall_time * num_workers) is spent in inter-process communication or
+    waiting for work.
+
+    :param debug_logger: logger to use
+    :type debug_logger: logging.Logger
+    :param name: name of the elaboration
+    :type name: str
+    :param num_workers: number of workers of the pool
+    :type num_workers: int
+    :param wall_time: elapsed time of the whole elaboration in seconds
+    :type wall_time: float
+    :param compute_time: sum of the compute time of the workers in seconds
+    :type compute_time: float
+    """
+    overhead = max(wall_time * num_workers - compute_time, 0.0)
+    debug_logger.debug(f'{name}: {num_workers} workers, wall time '
+                       f'{wall_time:.3f} s, compute time {compute_time:.3f} s, '
+                       f'IPC and idle time {overhead:.3f} s')
@@ -0,0 +1,53 @@
+import itertools
+import pathlib
+import random
+import sys
+
+import numpy as np
+import pytest
+from gensim.corpora import Dictionary
+from gensim.models import CoherenceModel
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / 'slrkit'))
+
+from coherence import (C_V_WINDOW_SIZE, CoherenceIndex,  # noqa: E402
+                       num_windows)
+
+VOCABULARY = [f'w{i}' for i in range(40)]
+TOPICS = [VOCABULARY[0:10], VOCABULARY[5:15], VOCABULARY[20:40],
+          VOCABULARY[30:40] + VOCABULARY[0:10]]
+
+
+def make_texts():
+    rng = random.Random(0)
+    texts = []
+    lengths = [3, 20, C_V_WINDOW_SIZE - 1, C_V_WINDOW_SIZE,
+               C_V_WINDOW_SIZE + 1, 250]
+    for n in range(60):
+        # some documents use few words, so they repeat inside each window
+        words = VOCABULARY[:8] if n % 3 == 0 else VOCABULARY
+        texts.append([rng.choice(words) for _ in range(lengths[n % 6])])
+
+    # documents with no top words, shorter and longer than the window
+    others = [f'x{i}' for i in range(10)]
+    texts.append([rng.choice(others) for _ in range(5)])
+    texts.append([rng.choice(others) for _ in range(200)])
+    # a word that leaves the window and enters it again
+    texts.append(['w1'] * 30 + ['w2', 'w1'] * 70)
+    return texts
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_c_v_same_as_gensim(restricted):
+    texts = make_texts()
+    cm = CoherenceModel(topics=TOPICS, texts=texts,
+                        dictionary=Dictionary(texts), coherence='c_v',
+                        processes=1)
+    expected = cm.get_coherence_per_topic()
+    words = None
+    if restricted:
+        # the index built by lda.py has only the top words
+        words = itertools.chain.from_iterable(TOPICS)
+    index = CoherenceIndex(texts, words=words)
+    coherence = index.c_v_per_topic(TOPICS, num_windows(texts))
+    np.testing.assert_allclose(coherence, expected, rtol=0, atol=1e-12)
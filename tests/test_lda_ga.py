@@ -0,0 +1,132 @@
+import pathlib
+import random
+import shutil
+import sys
+import threading
+import uuid
+from multiprocessing.pool import ThreadPool
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / 'slrkit'))
+
+from lda_ga import (LDA_PASSES, RESULTS_TABLE, FitnessStore,  # noqa: E402
+                    SuccessiveHalving, ea_steady_state, load_ga_params,
+                    load_results, new_result, prepare_ga_toolbox)
+
+GA_PARAMS = """
+[limits]
+min_topics = 2
+max_topics = 30
+max_no_below = 10
+min_no_above = 0.1
+[algorithm]
+mu = 6
+lambda = 4
+initial = 8
+generations = {generations}
+tournament_size = 3
+[fidelity]
+low_passes = {low_passes}
+promote = 0.5
+patience = 0
+"""
+
+
+class FakeEvaluate:
+    """
+    Replaces lda_ga.evaluate with a score computed from the individual
+
+    The full trainings have better scores than all the first trainings. The
+    models are saved and replaced as evaluate does, with an empty model file.
+    """
+
+    def __init__(self, modeldir):
+        self.modeldir = modeldir
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, ind, passes=LDA_PASSES, u=None, save_above=None):
+        score = random.Random(hash(ind)).random()
+        if passes == LDA_PASSES:
+            score += 1
+        if u is None:
+            u = str(uuid.uuid4())
+        else:
+            shutil.rmtree(self.modeldir / u, ignore_errors=True)
+        result = new_result(ind, u, 0, 10)
+        result['coherence'] = score
+        result['passes'] = passes
+        if save_above is None or score > save_above:
+            (self.modeldir / u).mkdir(exist_ok=True)
+            (self.modeldir / u / 'model').touch()
+            result['saved_model'] = True
+        with self._lock:
+            self.calls.append((passes, save_above, score))
+        return result
+
+
+def run_ga(tmp_path, generations, low_passes, keep_models,
+           record_initial=True):
+    params_file = tmp_path / 'ga_params.toml'
+    params_file.write_text(GA_PARAMS.format(generations=generations,
+                                            low_passes=low_passes))
+    params = load_ga_params(params_file)
+    random.seed(1)
+    toolbox = prepare_ga_toolbox(10, params)
+    modeldir = tmp_path / 'models'
+    modeldir.mkdir(exist_ok=True)
+    evaluate = FakeEvaluate(modeldir)
+    toolbox.register('evaluate', evaluate)
+    store = FitnessStore(modeldir, 0, 10, tmp_path / RESULTS_TABLE,
+                         keep_models)
+    results = load_results(tmp_path)
+    if results is not None:
+        store.load(results)
+    fidelity = None
+    if low_passes > 0:
+        fidelity = SuccessiveHalving(low_passes, params['fidelity']['promote'])
+    pop = toolbox.population(n=params['algorithm']['initial'])
+    with ThreadPool(1) as pool:
+        ea_steady_state(pop, toolbox, store, pool, 1,
+                        mu=params['algorithm']['mu'],
+                        lambda_=params['algorithm']['lambda'],
+                        cxpb=params['probabilities']['mate'],
+                        mutpb=params['probabilities']['mutate'],
+                        ngen=generations, verbose=False, fidelity=fidelity,
+                        record_initial=record_initial)
+
+    return evaluate.calls, modeldir
+
+
+@pytest.fixture(autouse=True)
+def restore_random():
+    state = random.getstate()
+    yield
+    random.setstate(state)
+
+
+def test_keep_models_with_low_passes(tmp_path):
+    calls, modeldir = run_ga(tmp_path, generations=4, low_passes=1,
+                             keep_models=2)
+    low = [(save_above, score) for passes, save_above, score in calls
+           if passes == 1]
+    full = [score for passes, _, score in calls if passes == LDA_PASSES]
+    # the first trainings are compared only among themselves
+    assert all(save_above is None for save_above, _ in low)
+    # the best first training is always promoted
+    best = max(score for _, score in low)
+    assert best + 1 in full
+    assert len(full) >= len(low) // 2
+    kept = [d for d in modeldir.iterdir() if (d / 'model').is_file()]
+    assert len(kept) == 2
+
+
+def test_resume_without_checkpoint(tmp_path):
+    # a run stopped before the end of the first generation
+    run_ga(tmp_path, generations=0, low_passes=0, keep_models=0)
+    records = load_results(tmp_path)
+    calls, _ = run_ga(tmp_path, generations=0, low_passes=0, keep_models=0,
+                      record_initial=False)
+    assert calls == []
+    assert len(load_results(tmp_path)) == len(records)
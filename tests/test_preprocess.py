@@ -0,0 +1,34 @@
+import io
+import pathlib
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / 'slrkit'))
+
+from preprocess import prepare_dataset, read_dataset_chunks  # noqa: E402
+
+DATASET = ('id,code,abstract\n'
+           '1,05,a b\n'
+           '2,07,c d\n'
+           '3,x1,e f\n'
+           '4,1.50,g h\n'
+           '5,,i j\n')
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 3, 10])
+def test_chunks_same_as_full_read(tmp_path, chunk_rows):
+    # 'code' is text in the whole file, but numeric in some chunks
+    datafile = tmp_path / 'dataset.csv'
+    datafile.write_text(DATASET, encoding='utf-8')
+    full = prepare_dataset(pd.read_csv(datafile, delimiter=',',
+                                       encoding='utf-8'),
+                           str(datafile), 'abstract')
+    chunked = io.StringIO()
+    for i, chunk in enumerate(read_dataset_chunks(str(datafile), ',',
+                                                  chunk_rows)):
+        chunk = prepare_dataset(chunk, str(datafile), 'abstract')
+        chunk.to_csv(chunked, header=i == 0, index=False)
+
+    assert chunked.getvalue() == full.to_csv(index=False)